@@ -1,12 +1,26 @@
 from flask import Flask
 from config.config import Config
 from extensions.extensions import db, api, bcrypt, login_manager
+from helpers.metrics import init_metrics
+from helpers.sql_trace import init_sql_trace
 from flask_cors import CORS
 from flask_session import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+import sqlite3
+import redis
+
+@event.listens_for(Engine, "connect")
+def enforce_foreign_keys(dbapi_connection, _):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config.setdefault('SESSION_REDIS', redis.from_url(app.config['REDIS_URL']))
 
     Session(app)
     CORS(app, supports_credentials=True, origins=['http://localhost:5173', 'http://localhost:4173'])
@@ -15,8 +29,48 @@ def create_app():
     login_manager.init_app(app)
     db.init_app(app)
     api.init_app(app)
+    init_metrics(app)
+    init_sql_trace(app)
 
-    with app.app_context():
-        db.create_all()
+    app.cli.command('init-db')(init_db)
+    app.cli.command('rebuild-stats')(rebuild_stats)
+
+    return app
+
+# The web app, the Celery worker and the mail helpers all import this one
+# instance, so a process builds a single app, engine and connection pool
+app = None
 
+def get_app():
+    global app
+    if app is None:
+        app = create_app()
     return app
+
+# Creates missing tables, indexes and the search index. Run once per deploy
+# with `flask init-db` rather than on every import.
+def init_db():
+    import models.models
+    from helpers.create_indexes import create_indexes
+    from helpers.search_index import create_search_index
+    from helpers.lot_stats import rebuild_lot_stats
+
+    with get_app().app_context():
+        has_stats = inspect(db.engine).has_table('lot_hourly_stats')
+
+        db.create_all()
+        create_indexes()
+        create_search_index()
+
+        # Fill the rollups from existing history the first time they appear
+        if not has_stats:
+            rebuild_lot_stats()
+
+# Backfills the lot_daily_stats, lot_hourly_stats and user_lot_stats rollups
+# from the full reservation history, with `flask rebuild-stats`
+def rebuild_stats():
+    from helpers.lot_stats import rebuild_lot_stats
+
+    with get_app().app_context():
+        lot_days, lot_hours, user_lots = rebuild_lot_stats()
+        print(f'Rebuilt {lot_days} lot-day, {lot_hours} lot-hour and {user_lots} user-lot rows')
@@ -0,0 +1,42 @@
+from benchmarks import common
+
+# Admin summary latency and statement count as the number of lots grows,
+# served uncached (the summary's version is bumped before every request)
+def main():
+    parser = common.parser('Admin summary latency against lot count')
+    parser.add_argument('--lots', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--spots', type=int, default=10, help='spots per lot')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = common.setup(args)
+
+    from sqlalchemy import insert
+    from extensions.extensions import db
+    from models.models import ParkingLots, ParkingSpots
+    from helpers.clear_redis_cache import bump_versions, ADMIN_SUMMARY_KEY
+
+    admin = common.client_for(app, 'admin@example.com')
+
+    def summary():
+        bump_versions([ADMIN_SUMMARY_KEY])
+        response = admin.get('/api/parking-lots/admin/summary')
+        assert response.status_code == 200, response.get_json()
+        return response
+
+    print(f'{"lots":>8} {"statements":>10} {"median ms":>10} {"p99 ms":>8}')
+    for lots in sorted(args.lots):
+        with app.app_context():
+            existing = ParkingLots.query.count()
+            db.session.execute(insert(ParkingLots.__table__), [dict(prime_location_name=f'Lot {number}', address='1 Main Road', pincode='560001', price=10, number_of_spots=args.spots) for number in range(existing, lots)])
+            new_ids = [lot_id for lot_id, in db.session.query(ParkingLots.id).filter(ParkingLots.id > existing)]
+            ParkingSpots.provision({lot_id: args.spots for lot_id in new_ids})
+            db.session.commit()
+
+        samples, _ = common.timings(summary, args.repeat)
+        with common.StatementCounter(app) as statements:
+            summary()
+        print(f'{lots:>8} {statements.count:>10} {common.median(samples):>10.1f} {common.percentile(samples, 0.99):>8.1f}')
+
+if __name__ == '__main__':
+    main()
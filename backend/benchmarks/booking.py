@@ -0,0 +1,50 @@
+from collections import Counter
+import threading
+import time
+
+from benchmarks import common
+
+# Many users booking in one lot at the same moment: latency percentiles and
+# a check that no spot ends up with two live reservations
+def main():
+    parser = common.parser('Concurrent bookings against one lot')
+    parser.add_argument('--bookers', type=int, default=40)
+    parser.add_argument('--spots', type=int, default=20)
+    args = parser.parse_args()
+
+    app = common.setup(args, eager_tasks=False)
+
+    from models.models import Reservations
+
+    admin = common.client_for(app, 'admin@example.com')
+    response = admin.post('/api/parking-lots/', json=dict(primeLocationName='North', address='1 Main Road', pincode='560001', price=10, maxSpots=args.spots))
+    assert response.status_code == 201, response.get_json()
+
+    clients = [common.client_for(app, f'user{number}@example.com') for number in range(args.bookers)]
+    barrier = threading.Barrier(args.bookers)
+    latencies = []
+    outcomes = Counter()
+
+    def book(number, client):
+        barrier.wait()
+        start = time.perf_counter()
+        response = client.post('/api/reservations/', json=dict(lotID=1, userID=number + 2, vehicleNo=f'WB12AB{number:04d}'))
+        latencies.append((time.perf_counter() - start) * 1000)
+        outcomes[response.status_code] += 1
+
+    threads = [threading.Thread(target=book, args=(number, client)) for number, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        spot_ids = [spot_id for spot_id, in Reservations.query.with_entities(Reservations.spot_id).filter(Reservations.status != 'completed')]
+
+    print(f'{args.bookers} bookers, {args.spots} spots')
+    print('responses:', ', '.join(f'{count} x {status}' for status, count in sorted(outcomes.items())))
+    print(f'reservations: {len(spot_ids)} on {len(set(spot_ids))} distinct spots')
+    print(f'latency: p50 {common.percentile(latencies, 0.5):.1f} ms, p99 {common.percentile(latencies, 0.99):.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every benchmark builds its data in a fresh SQLite database (a temporary
+# file unless --database is given) and, unless --redis is passed, an
+# in-process fakeredis, so it can run anywhere and never touches real data.
+# Celery tasks run eagerly in the benchmark's own process, or with
+# eager_tasks=False are queued on an in-memory broker and never run, as a
+# request would leave them for the worker.
+def parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--database', help='SQLite file to build the data in (default: a temporary file)')
+    parser.add_argument('--redis', action='store_true', help='use the Redis server at REDIS_URL instead of fakeredis')
+    return parser
+
+def setup(args, eager_tasks=True, **config):
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    if os.path.exists(database):
+        raise SystemExit(f'{database} already exists, pass a path for a new database')
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath(database)}'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ.setdefault('MAIL_DEFAULT_SENDER', 'parkman@example.com')
+    os.environ['SQL_TRACE'] = 'False'
+    for name, value in config.items():
+        os.environ[name] = str(value)
+
+    if not args.redis:
+        import fakeredis
+        import redis
+
+        server = fakeredis.FakeServer()
+
+        class FakeRedis(fakeredis.FakeRedis):
+            def __init__(self, *args, **kwargs):
+                super().__init__(server=server)
+
+        redis.Redis = FakeRedis
+        redis.StrictRedis = FakeRedis
+        redis.from_url = lambda *args, **kwargs: FakeRedis()
+
+    sys.path.insert(0, BACKEND_ROOT)
+    os.chdir(BACKEND_ROOT)
+
+    from app import app
+    from app_factory import init_db
+    from helpers.celery_worker import celery
+
+    app.config.update(TESTING=True, MAIL_SUPPRESS_SEND=True)
+    if eager_tasks:
+        celery.conf.update(task_always_eager=True, task_eager_propagates=True)
+    else:
+        celery.conf.update(broker_url='memory://', result_backend='cache+memory://')
+    init_db()
+    return app
+
+def client_for(app, email, password='password'):
+    client = app.test_client()
+    client.post('/api/register', json=dict(email=email, name=email.split('@')[0], password=password, address='1 Main Road', pincode='560001', phone='9999999999'))
+    response = client.post('/api/login', json=dict(email=email, password=password))
+    assert response.status_code == 200, response.get_json()
+    return client
+
+# Runs fn `repeat` times after one warm-up call and returns the timings in
+# milliseconds with the last result
+def timings(fn, repeat):
+    result = fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, result
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def median(samples):
+    return statistics.median(samples)
+
+# Statements run on the app's engine inside the block
+class StatementCounter:
+    def __init__(self, app):
+        from extensions.extensions import db
+        from sqlalchemy import event
+
+        with app.app_context():
+            self.engine = db.engine
+        self.count = 0
+        self.event = event
+
+    def record(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        self.event.listen(self.engine, 'before_cursor_execute', self.record)
+        return self
+
+    def __exit__(self, *exc):
+        self.event.remove(self.engine, 'before_cursor_execute', self.record)
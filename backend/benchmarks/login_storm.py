@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import Counter
+
+from benchmarks import common
+
+# Latency of a non-auth endpoint on its own and while a storm of concurrent
+# logins runs at the production bcrypt cost; with hashing bounded to its
+# pool and logins handing back their connection, it should stay flat
+def main():
+    parser = common.parser('Non-auth endpoint latency during a login storm')
+    parser.add_argument('--logins', type=int, default=200, help='logins fired by the storm')
+    parser.add_argument('--threads', type=int, default=32, help='threads firing them')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost of the stored password')
+    parser.add_argument('--polls', type=int, default=200, help='requests to the non-auth endpoint per phase')
+    args = parser.parse_args()
+
+    app = common.setup(args, BCRYPT_LOG_ROUNDS=args.rounds)
+
+    admin = common.client_for(app, 'admin@example.com')
+    response = admin.post('/api/parking-lots/', json=dict(primeLocationName='North', address='1 Main Road', pincode='560001', price=10, maxSpots=100))
+    assert response.status_code == 201, response.get_json()
+    common.client_for(app, 'user@example.com')
+
+    def poll():
+        response = admin.get('/api/parking-lots/1/available-spot')
+        assert response.status_code == 200, response.get_json()
+
+    def poll_latencies():
+        samples = []
+        for _ in range(args.polls):
+            start = time.perf_counter()
+            poll()
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    poll()
+    quiet = poll_latencies()
+
+    remaining = iter(range(args.logins))
+    remaining_lock = threading.Lock()
+    login_latencies = []
+    outcomes = Counter()
+
+    def storm():
+        client = app.test_client()
+        while True:
+            with remaining_lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            response = client.post('/api/login', json=dict(email='user@example.com', password='password'))
+            login_latencies.append((time.perf_counter() - start) * 1000)
+            outcomes[response.status_code] += 1
+
+    threads = [threading.Thread(target=storm) for _ in range(args.threads)]
+    storm_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    during = poll_latencies()
+    for thread in threads:
+        thread.join()
+    storm_seconds = time.perf_counter() - storm_start
+
+    print(f'{args.logins} logins from {args.threads} threads at bcrypt cost {args.rounds}, {app.config["PASSWORD_HASH_WORKERS"]} hashing workers')
+    print('login responses:', ', '.join(f'{count} x {status}' for status, count in sorted(outcomes.items())), f'in {storm_seconds:.1f}s')
+    print(f'login latency: p50 {common.percentile(login_latencies, 0.5):.0f} ms, p99 {common.percentile(login_latencies, 0.99):.0f} ms')
+    print(f'{"available-spot":16} {"p50 ms":>8} {"p99 ms":>8}')
+    print(f'{"quiet":16} {common.percentile(quiet, 0.5):>8.1f} {common.percentile(quiet, 0.99):>8.1f}')
+    print(f'{"during storm":16} {common.percentile(during, 0.5):>8.1f} {common.percentile(during, 0.99):>8.1f}')
+
+if __name__ == '__main__':
+    main()
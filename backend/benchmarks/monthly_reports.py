@@ -0,0 +1,44 @@
+from datetime import datetime
+import random
+import time
+
+from benchmarks import common
+
+# Builds, renders and mails a month of reports through an in-process SMTP
+# server, with the chunk tasks run eagerly in this process
+def main():
+    parser = common.parser('Monthly report throughput')
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--bookings', type=int, default=8, help='completed stays per user this month')
+    parser.add_argument('--connect-delay', type=float, default=0.0, help='seconds the SMTP server waits before greeting')
+    args = parser.parse_args()
+
+    from utils.fake_smtp import FakeSMTPServer
+
+    server = FakeSMTPServer(connect_delay=args.connect_delay).start()
+    app = common.setup(args, MAIL_SERVER='127.0.0.1', MAIL_PORT=server.port, MAIL_USE_TLS='False')
+    app.config.update(TESTING=False, MAIL_SUPPRESS_SEND=False)
+
+    from sqlalchemy import insert
+    from extensions.extensions import db
+    from models.models import Users, ParkingLots, ParkingSpots, Reservations
+    import tasks
+
+    random.seed(1)
+    now = datetime.now()
+    with app.app_context():
+        db.session.execute(insert(ParkingLots.__table__), [dict(prime_location_name=f'Lot {number}', address='1 Main Road', pincode='560001', price=50, number_of_spots=1) for number in range(5)])
+        db.session.execute(insert(ParkingSpots.__table__), [dict(lot_id=lot_id, status='available') for lot_id in range(1, 6)])
+        db.session.execute(insert(Users.__table__), [dict(email=f'user{number}@example.com', name=f'User {number}', password='x', phone_number='9999999999', is_admin=False) for number in range(args.users)])
+        db.session.execute(insert(Reservations.__table__), [dict(spot_id=random.randint(1, 5), user_id=user_id, parking_timestamp=datetime(now.year, now.month, 1 + day), parking_cost=100, status='completed', vehicle_number='WB12AB1234') for user_id in range(1, args.users + 1) for day in range(args.bookings)])
+        db.session.commit()
+
+    start = time.perf_counter()
+    tasks.send_monthly_reports.delay()
+    seconds = time.perf_counter() - start
+
+    print(f'{args.users} reports in {seconds:.1f}s ({args.users / seconds:.1f} reports/s), {server.messages} messages over {server.connections} SMTP connections')
+    server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, date
+import random
+import time
+
+from benchmarks import common
+
+# Occupancy heatmap for one lot with a year of synthetic stays: the rollup
+# backfill, a raw NumPy sweep over every stay, and the endpoint cold and
+# cached for a year and a month
+def main():
+    parser = common.parser('Occupancy heatmap over a year of stays')
+    parser.add_argument('--stays', type=int, default=1000000)
+    parser.add_argument('--spots', type=int, default=500)
+    parser.add_argument('--utilization', type=float, default=0.6, help='average share of spot time occupied, which sets the stay lengths')
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    app = common.setup(args, eager_tasks=False)
+
+    from sqlalchemy import insert
+    from extensions.extensions import db
+    from models.models import Reservations
+    from helpers.clear_redis_cache import bump_versions, lot_occupancy_key
+    from helpers.lot_stats import rebuild_lot_stats
+    from helpers.occupancy import load_intervals, occupied_minutes_per_hour, to_minutes
+
+    admin = common.client_for(app, 'admin@example.com')
+    response = admin.post('/api/parking-lots/', json=dict(primeLocationName='North', address='1 Main Road', pincode='560001', price=10, maxSpots=args.spots))
+    assert response.status_code == 201, response.get_json()
+
+    random.seed(1)
+    year_start = datetime(args.year, 1, 1)
+    year_minutes = (datetime(args.year + 1, 1, 1) - year_start).days * 1440
+    longest_stay = max(2, int(2 * args.utilization * args.spots * year_minutes / args.stays))
+    start = time.perf_counter()
+    with app.app_context():
+        for offset in range(0, args.stays, 100000):
+            rows = []
+            for _ in range(offset, min(args.stays, offset + 100000)):
+                parked = year_start + timedelta(minutes=random.randrange(year_minutes), seconds=random.randrange(60))
+                rows.append(dict(spot_id=random.randint(1, args.spots), user_id=1, parking_timestamp=parked, leaving_timestamp=parked + timedelta(minutes=random.randint(1, longest_stay)), parking_cost=10, status='completed', vehicle_number='WB12AB0000'))
+            db.session.execute(insert(Reservations.__table__), rows)
+        db.session.commit()
+    print(f'{args.stays:,} stays over {args.spots} spots loaded in {time.perf_counter() - start:.1f}s')
+
+    with app.app_context():
+        start = time.perf_counter()
+        lot_days, lot_hours, user_lots = rebuild_lot_stats()
+        print(f'rollup backfill: {lot_hours:,} lot-hours in {time.perf_counter() - start:.1f}s')
+
+        starts, ends = load_intervals(1)
+        first_hour = to_minutes(year_start) // 60
+        samples, _ = common.timings(lambda: occupied_minutes_per_hour(starts, ends, first_hour, year_minutes // 60), args.repeat)
+        print(f'NumPy sweep of {len(starts):,} raw intervals: {common.median(samples):.1f} ms')
+
+    for label, first, last in [('year', date(args.year, 1, 1), date(args.year, 12, 31)), ('month', date(args.year, 6, 1), date(args.year, 6, 30))]:
+        url = f'/api/parking-lots/admin/1/occupancy?from={first}&to={last}'
+
+        def cold():
+            bump_versions([lot_occupancy_key(1)])
+            response = admin.get(url)
+            assert response.status_code == 200, response.get_json()
+            return response
+
+        cold_samples, response = common.timings(cold, args.repeat)
+        cached_samples, _ = common.timings(lambda: admin.get(url), args.repeat)
+        print(f'endpoint, {label}: {common.median(cold_samples):.1f} ms, {common.median(cached_samples):.1f} ms cached, utilization {response.get_json()["utilization"]}%')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import time
+
+from benchmarks import common
+
+# Bytes, latency and CPU time per poll of the dashboard endpoints, in three
+# modes: rendered from the database (the resource's version is bumped before
+# every poll), served from the cache without an ETag, and revalidated with
+# If-None-Match, which @cached answers with a 304 from the version counter
+def main():
+    parser = common.parser('Bytes and time per poll of the cached dashboard endpoints')
+    parser.add_argument('--lots', type=int, default=200)
+    parser.add_argument('--spots', type=int, default=100, help='spots per lot')
+    parser.add_argument('--polls', type=int, default=200)
+    args = parser.parse_args()
+
+    app = common.setup(args)
+
+    from sqlalchemy import insert
+    from extensions.extensions import db
+    from models.models import ParkingLots, ParkingSpots
+    from helpers.clear_redis_cache import bump_versions, LOTS_KEY, ADMIN_SUMMARY_KEY, spots_key
+
+    admin = common.client_for(app, 'admin@example.com')
+
+    with app.app_context():
+        db.session.execute(insert(ParkingLots.__table__), [dict(prime_location_name=f'Lot {number}', address='1 Main Road', pincode='560001', price=10, number_of_spots=args.spots) for number in range(args.lots)])
+        ParkingSpots.provision({lot_id: args.spots for lot_id, in db.session.query(ParkingLots.id)})
+        db.session.commit()
+
+    endpoints = [
+        ('get_lots', '/api/parking-lots/', LOTS_KEY),
+        ('get_spots', '/api/parking-lots/1/spots', spots_key(1)),
+        ('admin_summary', '/api/parking-lots/admin/summary', ADMIN_SUMMARY_KEY),
+    ]
+
+    def poll(url, expected_status, headers=None, key=None):
+        if key:
+            bump_versions([key])
+        response = admin.get(url, headers=headers or {})
+        assert response.status_code == expected_status, response.status_code
+        return response
+
+    print(f'{"endpoint":14} {"mode":12} {"bytes/poll":>10} {"ms/poll":>8} {"cpu ms/poll":>11}')
+    for name, url, key in endpoints:
+        modes = [
+            ('uncached', lambda: poll(url, 200, key=key)),
+            ('cached 200', lambda: poll(url, 200)),
+            ('304', lambda: poll(url, 304, headers={'If-None-Match': etag})),
+        ]
+
+        for mode, request in modes:
+            # The version the 304 polls revalidate against
+            etag = poll(url, 200).headers['ETag']
+            cpu_start = time.process_time()
+            samples, response = common.timings(request, args.polls)
+            cpu_ms = (time.process_time() - cpu_start) * 1000 / (args.polls + 1)
+            print(f'{name:14} {mode:12} {len(response.get_data()):>10,} {common.median(samples):>8.2f} {cpu_ms:>11.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import time
+
+from benchmarks import common
+
+# Spot write throughput for adding, growing, shrinking and importing lots
+def main():
+    parser = common.parser('Spot provisioning throughput')
+    parser.add_argument('--spots', type=int, default=10000, help='spots in the lot that is added, then grown and shrunk')
+    parser.add_argument('--import-lots', type=int, default=50)
+    parser.add_argument('--import-spots', type=int, default=2000, help='spots per imported lot')
+    args = parser.parse_args()
+
+    # The per-lot and per-import limits are set to this run's scale
+    app = common.setup(args, eager_tasks=False, MAX_LOT_SPOTS=max(args.spots * 2, args.import_spots), MAX_IMPORT_LOTS=args.import_lots, MAX_IMPORT_SPOTS=args.import_lots * args.import_spots)
+
+    from extensions.extensions import db
+    from models.models import ParkingSpots
+
+    admin = common.client_for(app, 'admin@example.com')
+
+    def lot(name, spots):
+        return dict(primeLocationName=name, address='1 Main Road', pincode='560001', price=10, maxSpots=spots)
+
+    def timed(label, request, expected_status, spots):
+        start = time.perf_counter()
+        response = request()
+        seconds = time.perf_counter() - start
+        assert response.status_code == expected_status, response.get_json()
+        print(f'{label:40} {seconds * 1000:8.0f} ms {spots / seconds:>12,.0f} spots/s')
+
+    timed(f'add_lot, {args.spots:,} spots', lambda: admin.post('/api/parking-lots/', json=lot('North', args.spots)), 201, args.spots)
+    timed(f'edit_lot, grow {args.spots:,} -> {args.spots * 2:,}', lambda: admin.put('/api/parking-lots/1', json=lot('North', args.spots * 2)), 200, args.spots)
+
+    # One occupied spot among those removed by the shrink has to survive it
+    with app.app_context():
+        spot = ParkingSpots.query.filter_by(lot_id=1).order_by(ParkingSpots.id.desc()).first()
+        spot.status = 'occupied'
+        db.session.commit()
+    timed(f'edit_lot, shrink {args.spots * 2:,} -> 100', lambda: admin.put('/api/parking-lots/1', json=lot('North', 100)), 200, args.spots * 2 - 100)
+
+    total = args.import_lots * args.import_spots
+    timed(f'import {args.import_lots} lots x {args.import_spots:,} spots', lambda: admin.post('/api/parking-lots/import', json=[lot(f'Lot {number}', args.import_spots) for number in range(args.import_lots)]), 201, total)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import random
+import time
+
+from benchmarks import common
+
+# Computes the daily reminder targets for a synthetic population: every
+# (user, lot) pair without a booking. Batches are counted instead of mailed,
+# so this times the target query and message building only.
+def main():
+    parser = common.parser('Daily reminder targets for a synthetic population')
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--lots', type=int, default=200)
+    parser.add_argument('--bookings', type=int, default=5, help='lots each user has booked in')
+    args = parser.parse_args()
+
+    app = common.setup(args)
+
+    from sqlalchemy import insert
+    from extensions.extensions import db
+    from models.models import Users, ParkingLots, ParkingSpots, Reservations
+    import tasks
+
+    random.seed(1)
+    start = time.perf_counter()
+    with app.app_context():
+        db.session.execute(insert(Users.__table__), [dict(email='admin@example.com', name='admin', password='x', phone_number='9999999999', is_admin=True)])
+        db.session.execute(insert(Users.__table__), [dict(email=f'user{number}@example.com', name=f'User {number}', password='x', phone_number='9999999999', is_admin=False) for number in range(args.users)])
+        db.session.execute(insert(ParkingLots.__table__), [dict(prime_location_name=f'Lot {number}', address='1 Main Road', pincode='560001', price=10, number_of_spots=1) for number in range(args.lots)])
+        db.session.execute(insert(ParkingSpots.__table__), [dict(lot_id=lot_id, status='available') for lot_id in range(1, args.lots + 1)])
+        db.session.execute(insert(Reservations.__table__), [dict(spot_id=spot_id, user_id=user_id, parking_cost=10, status='completed', vehicle_number='WB12AB0000') for user_id in range(2, args.users + 2) for spot_id in random.sample(range(1, args.lots + 1), min(args.bookings, args.lots))])
+        db.session.commit()
+    print(f'{args.users} users x {args.lots} lots, {args.bookings} bookings each, loaded in {time.perf_counter() - start:.1f}s')
+
+    sent = {'batches': 0, 'reminders': 0}
+
+    def count_batch(batch):
+        sent['batches'] += 1
+        sent['reminders'] += len(batch)
+    tasks.send_reminder_batch.delay = count_batch
+
+    with common.StatementCounter(app) as statements:
+        start = time.perf_counter()
+        tasks.send_daily_reminders.delay()
+        seconds = time.perf_counter() - start
+
+    print(f'{sent["reminders"]} reminders in {sent["batches"]} batches, {statements.count} statements, {seconds:.1f}s ({sent["reminders"] / seconds:,.0f} targets/s)')
+
+if __name__ == '__main__':
+    main()
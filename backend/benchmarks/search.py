@@ -0,0 +1,52 @@
+import random
+import time
+
+from benchmarks import common
+
+WORDS = ['Central', 'Mall', 'Tech', 'Park', 'Station', 'Market', 'Airport', 'Harbour', 'Garden', 'Plaza', 'Square', 'Tower', 'Metro', 'City', 'Lake', 'Hill', 'North', 'South', 'East', 'West']
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Ayaan', 'Krishna', 'Ishaan', 'Ananya', 'Diya', 'Priya', 'Kavya', 'Riya', 'Sneha', 'Pooja', 'Neha', 'Meera', 'Tara']
+LAST_NAMES = ['Sharma', 'Verma', 'Gupta', 'Singh', 'Kumar', 'Das', 'Bose', 'Iyer', 'Nair', 'Reddy', 'Mehta', 'Shah', 'Patel', 'Joshi', 'Rao', 'Ghosh', 'Sen', 'Roy', 'Dutta', 'Banerjee']
+
+# Lot and user search through the trigram index against the unindexed
+# ILIKE '%term%' scan it replaced
+def main():
+    parser = common.parser('Lot and user search at scale')
+    parser.add_argument('--lots', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = common.setup(args)
+
+    from sqlalchemy import insert
+    from extensions.extensions import db
+    from models.models import ParkingLots, Users
+    from helpers.search_index import search
+    from helpers.pagination import DEFAULT_PAGE_SIZE
+
+    random.seed(1)
+    start = time.perf_counter()
+    with app.app_context():
+        db.session.execute(insert(ParkingLots.__table__), [dict(prime_location_name=f'{random.choice(WORDS)} {random.choice(WORDS)} {number}', address='1 Main Road', pincode=str(random.randint(100000, 999999)), price=50, number_of_spots=10) for number in range(args.lots)])
+        db.session.execute(insert(Users.__table__), [dict(email=f'user{number}@example{number % 50}.com', name=f'{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)} {number}', password='x', phone_number='9999999999', is_admin=False) for number in range(args.users)])
+        db.session.commit()
+    print(f'{args.lots} lots and {args.users} users loaded and indexed in {time.perf_counter() - start:.1f}s\n')
+
+    cases = [
+        ('lots name "plaza"', ParkingLots, ParkingLots.prime_location_name, 'plaza'),
+        ('lots name typo "plazza"', ParkingLots, ParkingLots.prime_location_name, 'plazza'),
+        ('lots pincode "5600"', ParkingLots, ParkingLots.pincode, '5600'),
+        ('users name "banerjee 12"', Users, Users.name, 'banerjee 12'),
+        ('users name typo "banerje 4242"', Users, Users.name, 'banerje 4242'),
+        ('users email "user4242@"', Users, Users.email, 'user4242@'),
+    ]
+
+    print(f'{"query":32} {"ILIKE ms":>9} {"rows":>7} {"search ms":>10} {"rows":>5}')
+    with app.app_context():
+        for label, model, column, term in cases:
+            scan, scanned = common.timings(lambda: model.query.filter(column.ilike(f'%{term}%')).all(), max(1, args.repeat // 5))
+            indexed, found = common.timings(lambda: search(model, column, term, DEFAULT_PAGE_SIZE), args.repeat)
+            print(f'{label:32} {common.median(scan):>9.1f} {len(scanned):>7} {common.median(indexed):>10.1f} {len(found):>5}')
+
+if __name__ == '__main__':
+    main()
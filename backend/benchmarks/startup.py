@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks import common
+
+# Each run imports an entry point in a fresh interpreter, timing from the
+# first import to a ready app, and reports which heavy modules it loaded
+ENTRY_POINTS = {
+    'web': 'import app\napp.app.test_client()',
+    'worker': 'import tasks',
+}
+
+HEAVY_MODULES = ['fpdf', 'flask_mail', 'numpy']
+
+RUN = '''
+import json, sys, time
+start = time.perf_counter()
+{code}
+print(json.dumps({{'ms': (time.perf_counter() - start) * 1000, 'loaded': [name for name in {modules!r} if name in sys.modules]}}))
+'''
+
+def run(code):
+    output = subprocess.run([sys.executable, '-c', RUN.format(code=code, modules=HEAVY_MODULES)], cwd=common.BACKEND_ROOT, env=os.environ, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+# Import-to-ready time of the web and worker entry points, on a database
+# whose schema already exists
+def main():
+    parser = common.parser('Import-to-ready time of the web and worker entry points')
+    parser.add_argument('--runs', type=int, default=15, help='cold starts per entry point')
+    args = parser.parse_args()
+
+    # Builds the schema once; the runs themselves import the app with the
+    # same settings but talk to no server until a request arrives
+    common.setup(args)
+
+    for name, code in ENTRY_POINTS.items():
+        run(code)
+        results = [run(code) for _ in range(args.runs)]
+        samples = [result['ms'] for result in results]
+        loaded = ', '.join(results[-1]['loaded']) or 'none'
+        print(f'{name:8} median {common.median(samples):7.0f} ms  min {min(samples):7.0f} ms  max {max(samples):7.0f} ms  heavy modules loaded: {loaded}')
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-import redis
 from dotenv import load_dotenv
 import os
 
@@ -12,11 +11,32 @@ class Config:
     
     SESSION_TYPE = os.getenv('SESSION_TYPE', 'redis')
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
-    SESSION_REDIS = redis.from_url(REDIS_URL)
 
     MAIL_SERVER=os.getenv('MAIL_SERVER', 'smtp.gmail.com')
-    MAIL_PORT=os.getenv('MAIL_PORT', 587)
-    MAIL_USE_TLS=os.getenv('MAIL_USE_TLS', True)
+    MAIL_PORT=int(os.getenv('MAIL_PORT', 587))
+    MAIL_USE_TLS=os.getenv('MAIL_USE_TLS', 'True').lower() in ('true', '1')
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
-    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', MAIL_USERNAME)
\ No newline at end of file
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', MAIL_USERNAME)
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 100))
+    MAIL_MAX_RETRIES = int(os.getenv('MAIL_MAX_RETRIES', 3))
+    MAIL_RETRY_BACKOFF = float(os.getenv('MAIL_RETRY_BACKOFF', 1))
+
+    REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 500))
+    MONTHLY_REPORT_CHUNK_SIZE = int(os.getenv('MONTHLY_REPORT_CHUNK_SIZE', 200))
+
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+
+    MAX_LOT_SPOTS = int(os.getenv('MAX_LOT_SPOTS', 10000))
+    MAX_IMPORT_LOTS = int(os.getenv('MAX_IMPORT_LOTS', 1000))
+    MAX_IMPORT_SPOTS = int(os.getenv('MAX_IMPORT_SPOTS', 100000))
+
+    SSE_MAX_SECONDS = int(os.getenv('SSE_MAX_SECONDS', 300))
+
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+    SQL_TRACE = os.getenv('SQL_TRACE', 'False').lower() in ('true', '1')
+    SQL_TRACE_N_PLUS_ONE = int(os.getenv('SQL_TRACE_N_PLUS_ONE', 5))
+    SQL_TRACE_SLOW_MS = float(os.getenv('SQL_TRACE_SLOW_MS', 100))
\ No newline at end of file
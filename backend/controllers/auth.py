@@ -1,12 +1,12 @@
 from flask import Blueprint, request, jsonify
 from extensions.extensions import db
 from flask_login import login_user, current_user, logout_user, login_required
-import bcrypt
 import sys
 
 sys.path.append('..')
 
 from models.models import Users
+from helpers.passwords import PasswordHasherBusy, hash_password, check_password, needs_rehash
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api')
 
@@ -27,9 +27,14 @@ def register():
     existing_user = Users.query.filter_by(email=email).first()
     if existing_user:
         return jsonify(success=False, message='User already exists'), 409
-    
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    new_user = Users(email=email, password=hashed_password.decode('utf-8'), name=name, address=address, pincode=str(pincode), phone_number=phone_number)
+    db.session.close()
+
+    try:
+        hashed_password = hash_password(password)
+    except PasswordHasherBusy:
+        return jsonify(success=False, message='Too many sign-ups in progress, please try again'), 503, {'Retry-After': '1'}
+
+    new_user = Users(email=email, password=hashed_password, name=name, address=address, pincode=str(pincode), phone_number=phone_number)
 
     try:
         db.session.add(new_user)
@@ -55,7 +60,20 @@ def login():
     try:
         user = Users.query.filter_by(email=email).first()
 
-        if user and bcrypt.checkpw(password.encode('utf-8'), user.password.encode('utf-8')):
+        # Hand the connection back before hashing, so logins waiting on the
+        # password pool don't starve the rest of the API of connections
+        db.session.close()
+
+        if user and check_password(password, user.password):
+            # Bring the hash up to the configured cost while the password is at hand
+            if needs_rehash(user.password):
+                try:
+                    user.password = hash_password(password)
+                    db.session.add(user)
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    pass
+
             login_user(user)
             return jsonify(success=True, user={"email": user.email, "name": user.name})
         else:
@@ -63,6 +81,8 @@ def login():
                 return jsonify(success=False, message='Invalid email address'), 401
             else:
                 return jsonify(success=False, message='Invalid password'), 401
+    except PasswordHasherBusy:
+        return jsonify(success=False, message='Too many logins in progress, please try again'), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify(success = False, message = 'Failed to login user', error = str(e)), 500
 
@@ -1,5 +1,5 @@
 from flask_login import current_user, login_required
-from flask import Blueprint, jsonify, send_from_directory
+from flask import Blueprint, request, jsonify, send_from_directory
 from tasks import export_parking_history_csv
 
 exports_bp = Blueprint('exports', __name__, url_prefix='/api/exports')
@@ -8,7 +8,8 @@ exports_bp = Blueprint('exports', __name__, url_prefix='/api/exports')
 @login_required
 def trigger_export():
     try:
-        export_parking_history_csv.delay(current_user.id)
+        data = request.get_json(silent=True) or {}
+        export_parking_history_csv.delay(current_user.id, compress=bool(data.get('gzip')))
         return jsonify(success = True, message = 'Export job started! You\'ll receive an email when it\'s ready.'), 201
     except Exception as e:
         return jsonify(success = False, message = 'Failed to start export job', error = str(e)), 500
@@ -16,4 +17,8 @@ def trigger_export():
 @exports_bp.route('/download/<filename>', methods=['GET'])
 @login_required
 def download_file(filename):
-    return send_from_directory('exports', filename, as_attachment=True)
\ No newline at end of file
+    if filename not in (f'export_user_{current_user.id}.csv', f'export_user_{current_user.id}.csv.gz'):
+        return jsonify(success = False, message = 'Export file not found'), 404
+
+    # Served with ETag/Last-Modified validators and byte-range support
+    return send_from_directory('exports', filename, as_attachment=True, conditional=True, etag=True, max_age=0)
\ No newline at end of file
@@ -0,0 +1,26 @@
+from flask import Blueprint, Response, request, jsonify, current_app
+from hmac import compare_digest
+import sys
+
+sys.path.append('..')
+
+from helpers.metrics import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Scraped by Prometheus, so it takes a bearer token (METRICS_TOKEN) rather
+# than a login session. Without a token it is only served in debug and
+# testing, and is otherwise hidden behind a 404.
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token and not (current_app.debug or current_app.testing):
+        return jsonify(success = False, message = 'Not found'), 404
+
+    if token and not compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify(success = False, message = 'Invalid metrics token'), 401
+
+    try:
+        return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        return jsonify(success = False, message = 'Failed to collect metrics', error = str(e)), 500
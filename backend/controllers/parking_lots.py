@@ -1,19 +1,43 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from extensions.extensions import db
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from sqlalchemy import func, case
+from decimal import Decimal, InvalidOperation
+from datetime import date, timedelta
+import csv
+import io
 import sys
-import redis
-import json
+import time
 
 sys.path.append('..')
 
-from models.models import ParkingLots, ParkingSpots, Reservations
-from helpers.clear_redis_cache import clear_redis_cache
+from models.models import ParkingLots, ParkingSpots, Reservations, LotDailyStats, UserLotStats
+from helpers.after_commit import after_commit
+from helpers.clear_redis_cache import invalidate_lot, LOTS_KEY, ADMIN_SUMMARY_KEY, ADMIN_ANALYTICS_KEY, spots_key, lot_occupancy_key, user_summary_key
+from helpers.response_cache import cached
+from helpers.admin_required import admin_required
+from helpers.occupancy import lot_occupancy, MAX_OCCUPANCY_DAYS
+from helpers.pagination import page_size, paginate_by_id
+from helpers.search_index import search, prefix_filter
+from helpers.spot_bitmap import packed_lot_spots, STATUSES
+from helpers.spot_events import publish_lot_reset, publish_lot_resets, can_resume, last_event_id, read_spot_events, format_sse
 
 parking_lots_bp = Blueprint('parking_lots', __name__, url_prefix='/api/parking-lots')
 
-r = redis.Redis()
+def lot_user_ids(lot_id):
+    return [user_id for user_id, in db.session.query(Reservations.user_id).join(ParkingSpots, ParkingSpots.id == Reservations.spot_id).filter(ParkingSpots.lot_id == lot_id).distinct()]
+
+# Spot counts must be whole numbers up to MAX_LOT_SPOTS; provisioning builds
+# every spot in one statement, so a typo like 10000000 would write that many
+# rows in one request. NaN, Infinity and 3.9 spots are rejected too.
+def parse_spot_count(value):
+    count = Decimal(str(value))
+    if not count.is_finite() or count < 0 or count != count.to_integral_value() or count > current_app.config['MAX_LOT_SPOTS']:
+        raise ValueError('Invalid number of spots')
+    return int(count)
+
+def invalid_spot_count():
+    return jsonify(success = False, message = f"Number of spots must be a whole number from 0 to {current_app.config['MAX_LOT_SPOTS']}"), 400
 
 @parking_lots_bp.route('/', methods=['POST'])
 @login_required
@@ -26,27 +50,90 @@ def add_lot():
     address = data.get('address')
     pincode = data.get('pincode')
     price = data.get('price')
-    max_spots = data.get('maxSpots')
+
+    try:
+        max_spots = parse_spot_count(data.get('maxSpots'))
+    except (ValueError, InvalidOperation):
+        return invalid_spot_count()
 
     try:
         new_lot = ParkingLots(prime_location_name=prime_location_name, address=address, pincode=pincode, price=price, number_of_spots=max_spots)
         db.session.add(new_lot)
         db.session.flush()
 
-        spots = [
-            ParkingSpots(lot_id=new_lot.id)
-            for _ in range(new_lot.number_of_spots)
-        ]
-        db.session.add_all(spots)
+        ParkingSpots.provision({new_lot.id: new_lot.number_of_spots})
 
+        after_commit(invalidate_lot, new_lot.id)
+        after_commit(publish_lot_reset, new_lot.id)
         db.session.commit()
-        clear_redis_cache()
         
         return jsonify(success = True, message = 'Parking lot added successfully'), 201
     except Exception as e:
         db.session.rollback()
         return jsonify(success = False, message = 'Failed to add parking lot', error = str(e)), 500
 
+# Lots to import, as a CSV upload or body with the add_lot field names as
+# headers, or as JSON (a list of lots, or {"lots": [...]})
+def read_import_rows():
+    if 'file' in request.files:
+        return list(csv.DictReader(io.StringIO(request.files['file'].read().decode('utf-8-sig'))))
+    if request.mimetype == 'text/csv':
+        return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+
+    data = request.get_json(silent=True)
+    return data.get('lots') if isinstance(data, dict) else data
+
+@parking_lots_bp.route('/import', methods=['POST'])
+@login_required
+def import_lots():
+    if not current_user.is_admin:
+        return jsonify(success = False, message = 'Only admins can import parking lots'), 400
+
+    rows = read_import_rows()
+    if not rows or not isinstance(rows, list):
+        return jsonify(success = False, message = 'No parking lots to import'), 400
+
+    if len(rows) > current_app.config['MAX_IMPORT_LOTS']:
+        return jsonify(success = False, message = f"Cannot import more than {current_app.config['MAX_IMPORT_LOTS']} parking lots at once"), 400
+
+    new_lots = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            # Prices must be finite; NaN and Infinity are rejected rather than stored
+            price = Decimal(str(row['price']))
+            if not price.is_finite() or price < 0:
+                raise ValueError('Invalid parking lot')
+
+            new_lot = ParkingLots(prime_location_name=row['primeLocationName'].strip(), address=row['address'].strip(), pincode=str(row['pincode']).strip(), price=price, number_of_spots=parse_spot_count(row['maxSpots']))
+            if not new_lot.prime_location_name or not new_lot.address or not new_lot.pincode:
+                raise ValueError('Invalid parking lot')
+        except (KeyError, TypeError, AttributeError, ValueError, InvalidOperation):
+            return jsonify(success = False, message = f'Invalid parking lot on row {number}'), 400
+
+        new_lots.append(new_lot)
+
+    if sum(new_lot.number_of_spots for new_lot in new_lots) > current_app.config['MAX_IMPORT_SPOTS']:
+        return jsonify(success = False, message = f"Cannot import more than {current_app.config['MAX_IMPORT_SPOTS']} parking spots at once"), 400
+
+    try:
+        # All lots in one batched INSERT, then all of their spots in another
+        db.session.add_all(new_lots)
+        db.session.flush()
+
+        ParkingSpots.provision({new_lot.id: new_lot.number_of_spots for new_lot in new_lots})
+
+        lot_ids = [new_lot.id for new_lot in new_lots]
+        spot_count = sum(new_lot.number_of_spots for new_lot in new_lots)
+
+        after_commit(invalidate_lot)
+        after_commit(publish_lot_resets, lot_ids)
+        db.session.commit()
+
+        return jsonify(success = True, message = f'{len(lot_ids)} parking lots imported successfully', lot_ids = lot_ids, spots = spot_count), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify(success = False, message = 'Failed to import parking lots', error = str(e)), 500
+
 @parking_lots_bp.route('/<int:id>', methods=['PUT'])
 @login_required
 def edit_lot(id):
@@ -54,6 +141,11 @@ def edit_lot(id):
         return jsonify(success = False, message = 'Only admins can edit parking lots'), 400
 
     data = request.get_json()
+    try:
+        new_count = parse_spot_count(data.get('maxSpots'))
+    except (ValueError, InvalidOperation):
+        return invalid_spot_count()
+
     try:
         parking_lot = ParkingLots.query.get(id)
 
@@ -61,22 +153,17 @@ def edit_lot(id):
             return jsonify(success = False, message = 'Parking lot ID not found'), 404
 
         old_count = parking_lot.number_of_spots
-        new_count = data.get('maxSpots')
+        user_ids = lot_user_ids(id)
 
         if new_count < old_count:
             removable_count = old_count - new_count
-            unoccupied_spots = ParkingSpots.query.filter(ParkingSpots.lot_id == id, ParkingSpots.status != 'occupied').limit(removable_count).all()
 
-            if len(unoccupied_spots) < removable_count:
+            if ParkingSpots.remove_unoccupied(id, removable_count) < removable_count:
+                db.session.rollback()
                 return jsonify(success = False, message = 'Cannot remove occupied parking spots'), 400
-            
-            for spot in unoccupied_spots:
-                db.session.delete(spot)
         
         elif new_count > old_count:
-            additional_count = new_count - old_count
-            new_spots = [ParkingSpots(lot_id=id, status='available') for _ in range(additional_count)]
-            db.session.add_all(new_spots)
+            ParkingSpots.provision({id: new_count - old_count})
 
         parking_lot.prime_location_name = data.get('primeLocationName')
         parking_lot.address = data.get('address')
@@ -84,8 +171,9 @@ def edit_lot(id):
         parking_lot.price = data.get('price')
         parking_lot.number_of_spots = new_count
         
+        after_commit(invalidate_lot, id, user_ids)
+        after_commit(publish_lot_reset, id)
         db.session.commit()
-        clear_redis_cache()
         return jsonify(success = True, message = 'Parking lot edited successfully')
     except Exception as e:
         db.session.rollback()
@@ -107,9 +195,11 @@ def delete_lot(id):
         if occupied_spots:
             return jsonify(success = False, message = 'Cannot delete lot as some spots are currently occupied'), 400
         
+        user_ids = lot_user_ids(id)
         db.session.delete(parking_lot)
+        after_commit(invalidate_lot, id, user_ids)
+        after_commit(publish_lot_reset, id)
         db.session.commit()
-        clear_redis_cache()
         return jsonify(success = True, message = 'Parking lot deleted successfully')
     except Exception as e:
         db.session.rollback()
@@ -117,32 +207,27 @@ def delete_lot(id):
 
 @parking_lots_bp.route('/', methods=['GET'])
 @login_required
+@cached(lambda: LOTS_KEY)
 def get_lots():
-    cached = r.get('parking:lots:all')
-
-    if cached:
-        return json.loads(cached)
+    cursor = request.args.get('cursor')
 
     try:
-        lots = ParkingLots.query.all()
+        lots, next_cursor = paginate_by_id(ParkingLots.query, ParkingLots.id, cursor, page_size())
 
-        if not lots:
+        if not lots and not cursor:
             return jsonify(success = False, message = 'No parking lots found'), 404
 
         lots_data = [lot.to_dict() for lot in lots]
-        r.set('parking:lots:all', json.dumps({'lots': lots_data, 'success': True}), ex=60)
-        return jsonify(success = True, lots = lots_data)
+        return jsonify(success = True, lots = lots_data, next_cursor = next_cursor)
+    except ValueError:
+        return jsonify(success = False, message = 'Invalid cursor'), 400
     except Exception as e:
         return jsonify(success = False, message = 'Failed to fetch parking lots', error = str(e)), 500
 
 @parking_lots_bp.route('/<int:lot_id>/spots', methods=['GET'])
 @login_required
+@cached(spots_key)
 def get_spots(lot_id):
-    cached = r.get(f'parking:lots:{lot_id}:spots')
-
-    if cached:
-        return json.loads(cached)
-
     try:
         lot = ParkingLots.query.get(lot_id)
         
@@ -150,11 +235,61 @@ def get_spots(lot_id):
             return jsonify(success = False, message = 'Parking lot not found'), 404
         
         spots_data = [spot.to_dict() for spot in lot.spots]
-        r.set(f'parking:lots:{lot_id}:spots', json.dumps({'spots': spots_data, 'success': True}), ex=60)
         return jsonify(success = True, spots = spots_data)
     except Exception as e:
         return jsonify(success = False, message = 'Failed to fetch parking spots', error = str(e)), 500
 
+@parking_lots_bp.route('/spots/bulk', methods=['GET'])
+@login_required
+def get_bulk_spots():
+    lot_ids = list(dict.fromkeys(int(lot_id) for lot_id in request.args.getlist('lot_id') if lot_id.isdigit()))
+
+    try:
+        if not lot_ids:
+            lot_ids = [lot_id for lot_id, in db.session.query(ParkingLots.id).order_by(ParkingLots.id)]
+
+        lots_data = packed_lot_spots(lot_ids)
+        return jsonify(success = True, statuses = STATUSES, lots = {str(lot_id): lots_data[lot_id] for lot_id in lot_ids})
+    except Exception as e:
+        return jsonify(success = False, message = 'Failed to fetch parking spots', error = str(e)), 500
+
+@parking_lots_bp.route('/spots/stream', methods=['GET'])
+@login_required
+def stream_spots():
+    lot_ids = {int(lot_id) for lot_id in request.args.getlist('lot_id') if lot_id.isdigit()}
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    max_seconds = current_app.config['SSE_MAX_SECONDS']
+
+    # Each open stream holds a worker thread, so it ends after max_seconds
+    # and EventSource reconnects, resuming from the Last-Event-ID
+    def events():
+        last_id = cursor
+        deadline = time.monotonic() + max_seconds
+
+        if not last_id or not can_resume(last_id):
+            last_id = last_event_id()
+            snapshot_ids = sorted(lot_ids) or [lot_id for lot_id, in db.session.query(ParkingLots.id).order_by(ParkingLots.id)]
+            lots_data = packed_lot_spots(snapshot_ids)
+            db.session.close()
+
+            # Packed the same way as /spots/bulk
+            yield format_sse('snapshot', {'statuses': STATUSES, 'lots': {str(lot_id): lots_data[lot_id] for lot_id in snapshot_ids}}, last_id)
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            delivered = False
+            for event_id, event in read_spot_events(last_id, block=max(1, int(min(remaining, 15) * 1000))):
+                last_id = event_id
+                if lot_ids and event['lot_id'] not in lot_ids:
+                    continue
+
+                yield format_sse(event.pop('type'), event, event_id)
+                delivered = True
+
+            if not delivered:
+                yield ': keep-alive\n\n'
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @parking_lots_bp.route('<int:lot_id>/available-spot', methods=['GET'])
 @login_required
 def get_first_available_spot(lot_id):
@@ -173,19 +308,22 @@ def get_first_available_spot(lot_id):
 def search_lots():
     location = request.args.get('location')
     pincode = request.args.get('pincode')
+    cursor = request.args.get('cursor')
 
     try:
-        if not location and not pincode:
-            lots = ParkingLots.query.all()
-
+        # Searches return the best matches in one ranked page
         if location:
-            lots = ParkingLots.query.filter(ParkingLots.prime_location_name.ilike(f'%{location}%')).all()
+            lots, next_cursor = search(ParkingLots, ParkingLots.prime_location_name, location, page_size()), None
+        elif pincode:
+            lots, next_cursor = search(ParkingLots, ParkingLots.pincode, pincode, page_size()), None
         else:
-            lots = ParkingLots.query.filter(ParkingLots.pincode.ilike(f'%{pincode}%')).all()
+            lots, next_cursor = paginate_by_id(ParkingLots.query, ParkingLots.id, cursor, page_size())
 
         lots_data = [lot.to_dict() for lot in lots]
         
-        return jsonify(success = True, lots = lots_data)
+        return jsonify(success = True, lots = lots_data, next_cursor = next_cursor)
+    except ValueError:
+        return jsonify(success = False, message = 'Invalid cursor'), 400
     except Exception as e:
         return jsonify(success = False, message = 'Failed to fetch parking lots', error = str(e)), 500
 
@@ -203,9 +341,9 @@ def admin_search_lots():
     
     try:
         if pincode:
-            lots = ParkingLots.query.filter(ParkingLots.pincode.like(f'{pincode}%')).all()
+            lots = ParkingLots.query.filter(prefix_filter(ParkingLots.pincode, pincode)).order_by(ParkingLots.pincode, ParkingLots.id).limit(page_size()).all()
         else:
-            lots = ParkingLots.query.filter(ParkingLots.prime_location_name.ilike(f'%{name}%')).all()
+            lots = search(ParkingLots, ParkingLots.prime_location_name, name, page_size())
         
         lots_data = [lot.to_dict() for lot in lots]
 
@@ -215,49 +353,110 @@ def admin_search_lots():
 
 @parking_lots_bp.route('/admin/summary', methods=['GET'])
 @login_required
+@admin_required('Only admins can view this summary')
+@cached(lambda: ADMIN_SUMMARY_KEY)
 def admin_summary():
-    if not current_user.is_admin:
-        return jsonify(success = False, message = 'Only admins can view this summary'), 400
-
-    cached = r.get('parking:lots:summary:admin')
-
-    if cached:
-        return json.loads(cached)
-
     try:
-        lots = ParkingLots.query.all()
+        revenue = db.session.query(LotDailyStats.lot_id, func.sum(LotDailyStats.revenue).label('revenue')).group_by(LotDailyStats.lot_id).subquery()
+        spot_counts = db.session.query(ParkingSpots.lot_id, func.sum(case((ParkingSpots.status == 'occupied', 1), else_=0)).label('occupied'), func.sum(case((ParkingSpots.status == 'unavailable', 1), else_=0)).label('unavailable')).group_by(ParkingSpots.lot_id).subquery()
+
+        lots = db.session.query(ParkingLots.prime_location_name, ParkingLots.number_of_spots, revenue.c.revenue, spot_counts.c.occupied, spot_counts.c.unavailable).outerjoin(revenue, revenue.c.lot_id == ParkingLots.id).outerjoin(spot_counts, spot_counts.c.lot_id == ParkingLots.id).order_by(ParkingLots.id).all()
 
         if not lots:
             return jsonify(success = False, message = 'No parking lots found'), 404
 
         lots_data = []
 
-        for lot in lots:
+        for name, number_of_spots, lot_revenue, occupied, unavailable in lots:
             lot_dict = {}
-            lot_dict['name'] = lot.prime_location_name
-            revenue = db.session.query(func.sum(Reservations.parking_cost)).join(ParkingSpots).filter(ParkingSpots.lot_id == lot.id, Reservations.status == 'completed').scalar()
-            lot_dict['revenue'] = float(revenue) if revenue else 0.0
-            lot_dict['occupied'] = ParkingSpots.query.filter_by(lot_id=lot.id, status='occupied').count()
-            lot_dict['unavailable'] = ParkingSpots.query.filter_by(lot_id=lot.id, status='unavailable').count()
-            lot_dict['available'] = lot.number_of_spots - lot_dict['occupied'] - lot_dict['unavailable']
+            lot_dict['name'] = name
+            lot_dict['revenue'] = float(lot_revenue) if lot_revenue else 0.0
+            lot_dict['occupied'] = int(occupied or 0)
+            lot_dict['unavailable'] = int(unavailable or 0)
+            lot_dict['available'] = number_of_spots - lot_dict['occupied'] - lot_dict['unavailable']
             lots_data.append(lot_dict)
         
-        r.set('parking:lots:summary:admin', json.dumps({'success': True, 'lots': lots_data}), ex=60)
         return jsonify(success = True, lots = lots_data)
     except Exception as e:
         return jsonify(success = False, message = 'Failed to fetch parking lots data', error = str(e)), 500
 
+@parking_lots_bp.route('/admin/analytics', methods=['GET'])
+@login_required
+@admin_required('Only admins can view analytics')
+@cached(lambda: ADMIN_ANALYTICS_KEY)
+def admin_analytics():
+    lot_ids = [int(lot_id) for lot_id in request.args.getlist('lot_id') if lot_id.isdigit()]
+
+    try:
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify(success = False, message = 'Dates must be in YYYY-MM-DD format'), 400
+
+    if start > end:
+        return jsonify(success = False, message = 'Start date must not be after end date'), 400
+
+    try:
+        query = db.session.query(LotDailyStats, ParkingLots.prime_location_name, ParkingLots.number_of_spots).join(ParkingLots, ParkingLots.id == LotDailyStats.lot_id).filter(LotDailyStats.day >= start, LotDailyStats.day <= end)
+        if lot_ids:
+            query = query.filter(LotDailyStats.lot_id.in_(lot_ids))
+
+        days_data = []
+        lots_data = {}
+        day_count = (end - start).days + 1
+
+        for stats, name, number_of_spots in query.order_by(LotDailyStats.day, LotDailyStats.lot_id):
+            day_dict = stats.to_dict()
+            day_dict['occupancy_rate'] = round(stats.occupied_minutes / (number_of_spots * 1440), 4) if number_of_spots else 0.0
+            days_data.append(day_dict)
+
+            lot_dict = lots_data.setdefault(stats.lot_id, {'lot_id': stats.lot_id, 'name': name, 'bookings': 0, 'revenue': 0.0, 'occupied_minutes': 0, 'peak_occupancy': 0, 'occupancy_rate': 0.0})
+            lot_dict['bookings'] += stats.bookings
+            lot_dict['revenue'] += float(stats.revenue)
+            lot_dict['occupied_minutes'] += stats.occupied_minutes
+            lot_dict['peak_occupancy'] = max(lot_dict['peak_occupancy'], stats.peak_occupancy)
+            lot_dict['occupancy_rate'] = round(lot_dict['occupied_minutes'] / (number_of_spots * 1440 * day_count), 4) if number_of_spots else 0.0
+
+        return jsonify(success = True, start = start.isoformat(), end = end.isoformat(), days = days_data, lots = list(lots_data.values()))
+    except Exception as e:
+        return jsonify(success = False, message = 'Failed to fetch parking lot analytics', error = str(e)), 500
+
+@parking_lots_bp.route('/admin/<int:lot_id>/occupancy', methods=['GET'])
+@login_required
+@admin_required('Only admins can view occupancy')
+@cached(lambda lot_id: lot_occupancy_key(lot_id))
+def admin_lot_occupancy(lot_id):
+    try:
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify(success = False, message = 'Dates must be in YYYY-MM-DD format'), 400
+
+    if start > end:
+        return jsonify(success = False, message = 'Start date must not be after end date'), 400
+
+    if (end - start).days >= MAX_OCCUPANCY_DAYS:
+        return jsonify(success = False, message = f'Date range must not exceed {MAX_OCCUPANCY_DAYS} days'), 400
+
+    try:
+        lot = ParkingLots.query.get(lot_id)
+        if not lot:
+            return jsonify(success = False, message = 'Parking lot not found'), 404
+
+        occupancy = lot_occupancy(lot.id, lot.number_of_spots, start, end)
+
+        return jsonify(success = True, lot_id = lot.id, name = lot.prime_location_name, number_of_spots = lot.number_of_spots, start = start.isoformat(), end = end.isoformat(), **occupancy)
+    except Exception as e:
+        return jsonify(success = False, message = 'Failed to fetch parking lot occupancy', error = str(e)), 500
+
 @parking_lots_bp.route('/summary', methods=['GET'])
 @login_required
+@cached(lambda: user_summary_key(current_user.id))
 def user_summary():
     user_id = current_user.id
 
-    cached = r.get(f'parking:lots:summary:users:{user_id}')
-    if cached:
-        return json.loads(cached)
-
     try:
-        data = db.session.query(ParkingLots.prime_location_name, func.count(Reservations.id), func.sum(Reservations.parking_cost)).join(ParkingSpots, ParkingSpots.id == Reservations.spot_id).join(ParkingLots, ParkingLots.id == ParkingSpots.lot_id).filter(Reservations.user_id == user_id, Reservations.status == 'completed').group_by(ParkingLots.prime_location_name).all()
+        data = db.session.query(ParkingLots.prime_location_name, func.sum(UserLotStats.bookings), func.sum(UserLotStats.revenue)).join(ParkingLots, ParkingLots.id == UserLotStats.lot_id).filter(UserLotStats.user_id == user_id).group_by(ParkingLots.prime_location_name).all()
 
         if not data:
             return jsonify(success = False, message = 'No parking lots found'), 404
@@ -268,7 +467,6 @@ def user_summary():
             'total_spent': float(d[2]) if d[2] else 0.0
         } for d in data]
 
-        r.set(f'parking:lots:summary:users:{user_id}', json.dumps({'success': True, 'lots': lots_data}), ex=60)
         return jsonify(success = True, lots = lots_data)
     except Exception as e:
         return jsonify(success = False, message = 'Failed to fetch parking lots data', error = str(e)), 500
\ No newline at end of file
@@ -7,7 +7,9 @@ import redis
 sys.path.append('..')
 
 from models.models import ParkingSpots, Reservations
-from helpers.clear_redis_cache import clear_redis_cache
+from helpers.after_commit import after_commit
+from helpers.clear_redis_cache import invalidate_spot, invalidate_lot
+from helpers.spot_events import publish_spot_status, publish_lot_reset
 
 parking_spots_bp = Blueprint('parking_spots', __name__, url_prefix='/api/parking-spots')
 
@@ -29,15 +31,19 @@ def delete_spot(spot_id):
             return jsonify(success = False, message = 'Cannot delete an occupied parking spot'), 400
         
         lot_id = spot.parking_lot.id
-        clear_redis_cache()
+        user_ids = [user_id for user_id, in db.session.query(Reservations.user_id).filter_by(spot_id=spot_id).distinct()]
 
         reservation = Reservations.query.filter_by(spot_id=spot_id).first()
         if reservation:
             db.session.delete(reservation)
             db.session.flush()
 
+        # The lot's spot count changes too, which the lot list, occupancy and
+        # analytics all report
         spot.parking_lot.number_of_spots -= 1
         db.session.delete(spot)
+        after_commit(invalidate_lot, lot_id, user_ids)
+        after_commit(publish_lot_reset, lot_id)
         db.session.commit()
         return jsonify(success = True, message = 'Successfully deleted parking spot')
     except Exception as e:
@@ -60,10 +66,11 @@ def mark_spot(spot_id):
             return jsonify(success = False, message = 'Cannot mark an occupied parking spot'), 400
 
 
-        lot_id = spot.parking_lot.id
-        clear_redis_cache()
+        lot_id = spot.lot_id
 
         spot.status = 'unavailable' if spot.status == 'available' else 'available'
+        after_commit(invalidate_spot, lot_id)
+        after_commit(publish_spot_status, lot_id, spot_id, spot.status)
         db.session.commit()
         return jsonify(success = True, message = 'Parking spot successfully marked')
     except Exception as e:
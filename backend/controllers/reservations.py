@@ -8,8 +8,12 @@ import redis
 
 sys.path.append('..')
 
-from models.models import Reservations, ParkingLots
-from helpers.clear_redis_cache import clear_redis_cache
+from models.models import Reservations, ParkingLots, ParkingSpots
+from helpers.after_commit import after_commit
+from helpers.clear_redis_cache import invalidate_reservation
+from helpers.spot_events import publish_spot_status
+from helpers.pagination import page_size, paginate_by_timestamp
+from helpers.lot_stats import record_completion
 
 r = redis.Redis()
 
@@ -30,16 +34,20 @@ def add_reservation():
         if reservation:
             return jsonify(success = False, message = 'Cannot book another spot with the same vehicle'), 400
 
+        spot_id = ParkingSpots.claim(lot_id, spot_id)
+        if not spot_id:
+            db.session.rollback()
+            return jsonify(success = False, message = 'No available parking spot'), 409
+
         parking_cost = lot.price
         new_reservation = Reservations(spot_id=spot_id, user_id=user_id, vehicle_number=vehicle_no, parking_cost=parking_cost, parking_timestamp=datetime.now())
         db.session.add(new_reservation)
-        db.session.flush()
-        new_reservation.spot.status = 'occupied'
+        after_commit(invalidate_reservation, lot_id, user_id)
+        after_commit(publish_spot_status, lot_id, spot_id, 'occupied')
+        after_commit(send_parking_reminder.delay, user_id, lot_id, spot_id)
         db.session.commit()
 
-        clear_redis_cache()
-        send_parking_reminder(user_id, lot_id, spot_id)
-        return jsonify(success = True, message = 'Parking spot booked successfully'), 201
+        return jsonify(success = True, message = 'Parking spot booked successfully', spot_id = spot_id), 201
     except Exception as e:
         db.session.rollback()
         return jsonify(success = False, message = 'Unexpected error while booking parking spot', error = str(e)), 500
@@ -48,12 +56,15 @@ def add_reservation():
 @login_required
 def get_reservations():
     id = current_user.id
+    cursor = request.args.get('cursor')
     try:
-        reservations = Reservations.query.filter_by(user_id=id).order_by(Reservations.parking_timestamp.desc()).all()
-        if not reservations:
+        reservations, next_cursor = paginate_by_timestamp(Reservations.history_query().filter(Reservations.user_id == id), Reservations.parking_timestamp, Reservations.id, cursor, page_size())
+        if not reservations and not cursor:
             return jsonify(success = False, message= 'No booked parking spots found'), 404
         
-        return jsonify(success = True, reservations = [reservation.to_dict() for reservation in reservations])
+        return jsonify(success = True, reservations = [Reservations.row_to_dict(reservation) for reservation in reservations], next_cursor = next_cursor)
+    except ValueError:
+        return jsonify(success = False, message = 'Invalid cursor'), 400
     except Exception as e:
         return jsonify(success = False, message = 'Failed to fetch reservations', error = str(e)), 500
 
@@ -67,20 +78,27 @@ def edit_reservations():
 
         if not reservation:
             return jsonify(success = False, message = 'Reservation ID not found'), 404
+
+        # Releasing again would count the stay twice in the rollups and free a
+        # spot someone else may hold by now
+        if reservation.status == 'completed':
+            return jsonify(success = False, message = 'Reservation already completed'), 400
         
+        lot_id = reservation.spot.lot_id
+
         if reservation.status == 'pending':
             reservation.status = 'active'
+            after_commit(invalidate_reservation, lot_id, reservation.user_id)
             db.session.commit()
-
-            clear_redis_cache()
             return jsonify(success = True, message = 'Parked successfully')
         
         reservation.leaving_timestamp = datetime.now()
         reservation.status = 'completed'
         reservation.spot.status = 'available'
+        record_completion(lot_id, reservation)
+        after_commit(invalidate_reservation, lot_id, reservation.user_id)
+        after_commit(publish_spot_status, lot_id, reservation.spot_id, 'available')
         db.session.commit()
-
-        clear_redis_cache()
         return jsonify(success = True, message = 'Spot released successfully')
     except Exception as e:
         db.session.rollback()
@@ -1,7 +1,6 @@
 from flask import Blueprint, request ,jsonify
 from flask_login import login_required, current_user
 from extensions.extensions import db
-import bcrypt
 import sys
 import redis
 
@@ -9,8 +8,13 @@ sys.path.append('..')
 
 r = redis.Redis()
 
-from models.models import Users, Reservations
-from helpers.clear_redis_cache import clear_redis_cache
+from models.models import Users, Reservations, ParkingSpots
+from helpers.after_commit import after_commit
+from helpers.clear_redis_cache import invalidate_user
+from helpers.pagination import page_size, paginate_by_id
+from helpers.search_index import search
+from helpers.passwords import PasswordHasherBusy, hash_password
+from helpers.session_user import invalidate_session_user
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -20,13 +24,17 @@ def get_users():
     if not current_user.is_admin:
         return jsonify(success = False, message = 'Only admins can fetch all users'), 400
     
+    cursor = request.args.get('cursor')
+
     try:
-        users = Users.query.all()
+        users, next_cursor = paginate_by_id(Users.query, Users.id, cursor, page_size())
 
-        if not users:
+        if not users and not cursor:
             return jsonify(success = False, message = 'No user details found'), 404
         
-        return jsonify(success = True, users = [user.to_dict() for user in users])
+        return jsonify(success = True, users = [user.to_dict() for user in users], next_cursor = next_cursor)
+    except ValueError:
+        return jsonify(success = False, message = 'Invalid cursor'), 400
     except Exception as e:
         return jsonify(success = False, message = 'Failed to fetch users', error = str(e)), 500
 
@@ -46,6 +54,7 @@ def edit_user(id):
         user.pincode = data.get('pincode')
         user.is_admin = data.get('isAdmin')
 
+        after_commit(invalidate_session_user, id)
         db.session.commit()
         return jsonify(success = True, message = 'User data edited successfully')
     except Exception as e:
@@ -64,18 +73,25 @@ def edit_user_profile(id):
         if password != data.get('confirmPassword'):
             return jsonify(success = False, message = 'Passwords don\'t match'), 400
         
+        # Hand the connection back before hashing, as login and register do
         if password:
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            db.session.close()
+            hashed_password = hash_password(password)
 
         user.name = data.get('name')
         user.email = data.get('email')
         if password:
-            user.password = hashed_password.decode('utf-8')
+            user.password = hashed_password
         user.address = data.get('address')
         user.pincode = data.get('pincode')
 
+        db.session.add(user)
+        after_commit(invalidate_session_user, id)
         db.session.commit()
         return jsonify(success = True, message = 'User profile edited successfully')
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return jsonify(success = False, message = 'Too many password changes in progress, please try again'), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify(success = False, message = 'Failed to edit user profile', error = str(e)), 500
@@ -100,10 +116,12 @@ def delete_user(id):
         if reservation_count:
             return jsonify(success = False, message = 'Cannot delete user who has booked reservations'), 400
         
+        lot_ids = [lot_id for lot_id, in db.session.query(ParkingSpots.lot_id).join(Reservations, Reservations.spot_id == ParkingSpots.id).filter(Reservations.user_id == id).distinct()]
+
         db.session.delete(user)
+        after_commit(invalidate_user, id, lot_ids)
+        after_commit(invalidate_session_user, id)
         db.session.commit()
-
-        clear_redis_cache()
         return jsonify(success = True, message = 'User deleted successfully')
     except Exception as e:
         db.session.rollback()
@@ -123,9 +141,9 @@ def admin_search_users():
     
     try:
         if name:
-            users = Users.query.filter(Users.name.ilike(f'%{name}%')).all()
+            users = search(Users, Users.name, name, page_size())
         else:
-            users = Users.query.filter(Users.email.ilike(f'%{email}%')).all()
+            users = search(Users, Users.email, email, page_size())
         
         users_data = [user.to_dict() for user in users]
 
@@ -0,0 +1,15 @@
+from functools import wraps
+from flask import jsonify
+from flask_login import current_user
+
+# Rejects non-admins before anything below it runs; views behind @cached
+# need this above the cache, or a cached admin payload reaches everyone
+def admin_required(message):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_user.is_admin:
+                return jsonify(success = False, message = message), 400
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
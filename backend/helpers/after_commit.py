@@ -0,0 +1,21 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from extensions.extensions import db
+
+# Queues a side effect (cache invalidation, Celery task) to run once the
+# current transaction commits; it is dropped if the transaction rolls back
+def after_commit(callback, *args, **kwargs):
+    db.session.info.setdefault('after_commit', []).append((callback, args, kwargs))
+
+@event.listens_for(Session, 'after_commit')
+def run_after_commit(session):
+    for callback, args, kwargs in session.info.pop('after_commit', []):
+        try:
+            callback(*args, **kwargs)
+        except Exception:
+            current_app.logger.exception('After-commit callback %s failed', getattr(callback, '__name__', callback))
+
+@event.listens_for(Session, 'after_rollback')
+def discard_after_commit(session):
+    session.info.pop('after_commit', None)
@@ -1,6 +1,10 @@
 from celery import Celery
+from celery.signals import before_task_publish
 from config.celery_config import Config
-from app_factory import create_app
+from app_factory import get_app
+from helpers.metrics import track_task
+from helpers.sql_trace import trace_task
+import time
 
 def make_celery(app):
     celery = Celery()
@@ -9,10 +13,16 @@ def make_celery(app):
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
             with app.app_context():
-                return self.run(*args, **kwargs)
+                run = lambda: self.run(*args, **kwargs)
+                return track_task(self, lambda: trace_task(self, run))
             
     celery.Task = ContextTask
     return celery
 
-flask_app = create_app()
+# Stamps each task message so the worker can tell how long it sat queued
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    headers['published_at'] = time.time()
+
+flask_app = get_app()
 celery = make_celery(flask_app)
\ No newline at end of file
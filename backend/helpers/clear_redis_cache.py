@@ -1,8 +1,80 @@
 import redis
+import time
 
 r = redis.Redis()
 
+LOTS_KEY = 'parking:lots:all'
+ADMIN_SUMMARY_KEY = 'parking:lots:summary:admin'
+ADMIN_ANALYTICS_KEY = 'parking:lots:analytics:admin'
+
+def spots_key(lot_id):
+    return f'parking:lots:{lot_id}:spots'
+
+def lot_occupancy_key(lot_id):
+    return f'parking:lots:{lot_id}:occupancy'
+
+def user_summary_key(user_id):
+    return f'parking:lots:summary:users:{user_id}'
+
+# Every cached resource has a version counter, exposed as its ETag and
+# embedded in the key its payload is cached under. Counters start from the
+# current time in milliseconds so they keep increasing if Redis loses them.
+def version_key(key):
+    return key.replace('parking:', 'parking:versions:', 1)
+
+def versioned_key(key, version):
+    return f'{key}:v{version}'
+
+def get_version(key):
+    version = r.get(version_key(key))
+    if version is None:
+        r.set(version_key(key), int(time.time() * 1000), nx=True)
+        version = r.get(version_key(key))
+    return int(version)
+
+def get_versions(keys):
+    versions = r.mget([version_key(key) for key in keys])
+    return [int(version) if version is not None else get_version(key) for key, version in zip(keys, versions)]
+
+# Bumping the version orphans the cached payload, which then expires on its
+# own TTL, so a payload computed before the write is never served again
+def bump_versions(keys):
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+
+    pipeline = r.pipeline(transaction=False)
+    for key in keys:
+        pipeline.set(version_key(key), int(time.time() * 1000), nx=True)
+        pipeline.incr(version_key(key))
+    pipeline.execute()
+
+# Reservation booked, parked or released
+def invalidate_reservation(lot_id, user_id):
+    bump_versions([spots_key(lot_id), lot_occupancy_key(lot_id), ADMIN_SUMMARY_KEY, ADMIN_ANALYTICS_KEY, user_summary_key(user_id)])
+
+# Spot marked available or unavailable
+def invalidate_spot(lot_id):
+    bump_versions([spots_key(lot_id), ADMIN_SUMMARY_KEY])
+
+# Lot added, edited or deleted, or one of its spots deleted, along with users
+# who booked in it
+def invalidate_lot(lot_id=None, user_ids=()):
+    keys = [LOTS_KEY, ADMIN_SUMMARY_KEY, ADMIN_ANALYTICS_KEY] + [user_summary_key(user_id) for user_id in user_ids]
+    if lot_id is not None:
+        keys += [spots_key(lot_id), lot_occupancy_key(lot_id)]
+    bump_versions(keys)
+
+# User deleted, along with lots they had booked in
+def invalidate_user(user_id, lot_ids=()):
+    bump_versions([user_summary_key(user_id), ADMIN_SUMMARY_KEY] + [spots_key(lot_id) for lot_id in lot_ids])
+
 def clear_redis_cache():
-    for key in r.scan_iter('parking:lots*'):
-        r.delete(key)
-    
\ No newline at end of file
+    batch = []
+    for key in r.scan_iter('parking:lots*', count=500):
+        batch.append(key)
+        if len(batch) >= 500:
+            r.unlink(*batch)
+            batch = []
+    if batch:
+        r.unlink(*batch)
@@ -0,0 +1,13 @@
+from extensions.extensions import db
+
+# db.create_all() skips tables that already exist, so indexes declared on
+# the models after a table was created are added here
+def create_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+if __name__ == '__main__':
+    from app_factory import init_db
+
+    init_db()
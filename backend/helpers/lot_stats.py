@@ -0,0 +1,180 @@
+from datetime import datetime, timedelta, time
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import case, delete, insert, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions.extensions import db
+import sys
+
+sys.path.append('..')
+
+from models.models import LotDailyStats, LotHourlyStats, UserLotStats, ParkingLots, ParkingSpots, Reservations
+from helpers.occupancy import load_intervals, occupied_minutes_per_hour, to_minutes, from_minutes
+
+# Adds values onto a stats row, creating it first if needed, in one
+# INSERT ... ON CONFLICT so concurrent completions can't lose an update.
+# peak_occupancy keeps the larger of the two values instead of adding up.
+def add_to_stats(model, key, values):
+    table = model.__table__
+    dialect_insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    statement = dialect_insert(table).values(**key, **values)
+
+    updates = {}
+    for column in values:
+        if column == 'peak_occupancy':
+            updates[column] = case((statement.excluded[column] > table.c[column], statement.excluded[column]), else_=table.c[column])
+        else:
+            updates[column] = table.c[column] + statement.excluded[column]
+
+    db.session.execute(statement.on_conflict_do_update(index_elements=list(key), set_=updates))
+
+# Splits a stay into the minutes it spent on each calendar day
+def minutes_per_day(start, end):
+    while start < end:
+        next_day = datetime.combine(start.date() + timedelta(days=1), time())
+        day_end = min(end, next_day)
+        yield start.date(), round((day_end - start).total_seconds() / 60)
+        start = day_end
+
+# Splits a stay into the minutes it spent in each hour, counted in whole
+# minutes the way the vectorized rebuild counts them, so both agree
+def minutes_per_hour(start, end):
+    start, end = to_minutes(start), to_minutes(end)
+    while start < end:
+        hour_start = start - start % 60
+        yield from_minutes(hour_start), min(end, hour_start + 60) - start
+        start = hour_start + 60
+
+# Most spots of a lot occupied at once on each day its stays cover, swept
+# from their arrivals and departures. Stays carried over midnight count
+# towards the next day too, even one with no arrivals of its own. Days
+# with nothing occupied are left out.
+def peaks_per_day(stays):
+    events = sorted([(start, 1) for start, end in stays if end > start] + [(end, -1) for start, end in stays if end > start])
+    peaks = defaultdict(int)
+    occupied = 0
+    day = None
+
+    # Departures sort before arrivals at the same moment, as a spot freed
+    # at 10:00 can be booked again at 10:00
+    for moment, change in events:
+        if not occupied:
+            day = moment.date()
+        while day < moment.date():
+            day += timedelta(days=1)
+            peaks[day] = max(peaks[day], occupied)
+
+        occupied += change
+        peaks[day] = max(peaks[day], occupied)
+
+    return {day: peak for day, peak in peaks.items() if peak}
+
+# Stays per lot overlapping [start, end); stays still open end now
+def overlapping_stays(start, end, *criteria):
+    now = datetime.now()
+    stays = defaultdict(list)
+    reservations = db.session.query(ParkingSpots.lot_id, Reservations.parking_timestamp, Reservations.leaving_timestamp) \
+    .join(ParkingSpots, ParkingSpots.id == Reservations.spot_id) \
+    .filter(Reservations.parking_timestamp < end, or_(Reservations.leaving_timestamp.is_(None), Reservations.leaving_timestamp > start), *criteria)
+
+    for lot_id, parking_timestamp, leaving_timestamp in reservations:
+        stays[lot_id].append((parking_timestamp, leaving_timestamp or now))
+    return stays
+
+# Peak occupancy of every lot on one day, from the stays overlapping it
+def day_peaks(day, *criteria):
+    start = datetime.combine(day, time())
+    stays = overlapping_stays(start, start + timedelta(days=1), *criteria)
+    peaks = {lot_id: peaks_per_day(lot_stays).get(day, 0) for lot_id, lot_stays in stays.items()}
+    return {lot_id: peak for lot_id, peak in peaks.items() if peak}
+
+# Stores a finished day's peak occupancy per lot; run nightly for the day
+# before, as peaks depend on every stay that overlapped the day
+def record_day_peaks(day):
+    peaks = day_peaks(day)
+    for lot_id, peak in peaks.items():
+        add_to_stats(LotDailyStats, {'lot_id': lot_id, 'day': day}, {'peak_occupancy': peak})
+    return peaks
+
+# A reservation was completed: the booking and its revenue count on the day
+# it started, its occupied minutes on each day and hour it covered
+def record_completion(lot_id, reservation):
+    add_to_stats(LotDailyStats, {'lot_id': lot_id, 'day': reservation.parking_timestamp.date()}, {'bookings': 1, 'revenue': reservation.parking_cost})
+    for day, minutes in minutes_per_day(reservation.parking_timestamp, reservation.leaving_timestamp):
+        add_to_stats(LotDailyStats, {'lot_id': lot_id, 'day': day}, {'occupied_minutes': minutes})
+    for hour, minutes in minutes_per_hour(reservation.parking_timestamp, reservation.leaving_timestamp):
+        add_to_stats(LotHourlyStats, {'lot_id': lot_id, 'hour': hour}, {'occupied_minutes': minutes})
+
+    add_to_stats(UserLotStats, {'user_id': reservation.user_id, 'lot_id': lot_id}, {'bookings': 1, 'revenue': reservation.parking_cost})
+
+# Hourly occupancy of completed stays, swept lot by lot in NumPy
+def hourly_stats_rows():
+    import numpy as np
+
+    rows = []
+    for lot_id, in db.session.query(ParkingLots.id):
+        starts, ends = load_intervals(lot_id, Reservations.status == 'completed', Reservations.leaving_timestamp.isnot(None))
+        if not len(starts):
+            continue
+
+        first_hour = starts.min() // 60
+        occupied = occupied_minutes_per_hour(starts, ends, first_hour, ends.max() // 60 - first_hour + 1)
+        for hour in np.flatnonzero(occupied):
+            rows.append({'lot_id': lot_id, 'hour': from_minutes((first_hour + hour) * 60), 'occupied_minutes': int(occupied[hour])})
+    return rows
+
+# Recomputes the rollups from the full reservation history in one ordered
+# pass, sweeping each lot's stays for its daily peak occupancy
+def rebuild_lot_stats():
+    daily = defaultdict(lambda: {'bookings': 0, 'revenue': Decimal(0), 'occupied_minutes': 0, 'peak_occupancy': 0})
+    user_totals = defaultdict(lambda: {'bookings': 0, 'revenue': Decimal(0)})
+    now = datetime.now()
+
+    reservations = db.session.query(ParkingSpots.lot_id, Reservations.user_id, Reservations.parking_timestamp, Reservations.leaving_timestamp, Reservations.parking_cost, Reservations.status) \
+    .join(ParkingSpots, ParkingSpots.id == Reservations.spot_id) \
+    .filter(Reservations.parking_timestamp.isnot(None)) \
+    .order_by(ParkingSpots.lot_id, Reservations.parking_timestamp) \
+    .yield_per(1000)
+
+    def record_peaks(lot_id, stays):
+        for day, peak in peaks_per_day(stays).items():
+            daily[(lot_id, day)]['peak_occupancy'] = peak
+
+    current_lot = None
+    stays = []
+
+    for lot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status in reservations:
+        if lot_id != current_lot:
+            record_peaks(current_lot, stays)
+            current_lot = lot_id
+            stays = []
+
+        # Stays still open have no end yet and hold their spot until now
+        stays.append((parking_timestamp, leaving_timestamp or now))
+
+        if status == 'completed' and leaving_timestamp:
+            day_stats = daily[(lot_id, parking_timestamp.date())]
+            day_stats['bookings'] += 1
+            day_stats['revenue'] += parking_cost
+            for day, minutes in minutes_per_day(parking_timestamp, leaving_timestamp):
+                daily[(lot_id, day)]['occupied_minutes'] += minutes
+
+            user_totals[(user_id, lot_id)]['bookings'] += 1
+            user_totals[(user_id, lot_id)]['revenue'] += parking_cost
+
+    record_peaks(current_lot, stays)
+
+    lot_hours = hourly_stats_rows()
+
+    db.session.execute(delete(LotDailyStats.__table__))
+    db.session.execute(delete(LotHourlyStats.__table__))
+    db.session.execute(delete(UserLotStats.__table__))
+    if daily:
+        db.session.execute(insert(LotDailyStats.__table__), [{'lot_id': lot_id, 'day': day, **values} for (lot_id, day), values in daily.items()])
+    if lot_hours:
+        db.session.execute(insert(LotHourlyStats.__table__), lot_hours)
+    if user_totals:
+        db.session.execute(insert(UserLotStats.__table__), [{'user_id': user_id, 'lot_id': lot_id, **values} for (user_id, lot_id), values in user_totals.items()])
+    db.session.commit()
+
+    return len(daily), len(lot_hours), len(user_totals)
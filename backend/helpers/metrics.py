@@ -0,0 +1,203 @@
+from collections import namedtuple, defaultdict
+from contextlib import contextmanager
+from bisect import bisect_left
+from datetime import datetime
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import redis
+import time
+
+r = redis.Redis()
+
+# The web app, Celery workers and beat run as separate processes, so metrics
+# are accumulated in Redis hashes (one per metric) that /metrics reads back.
+# Histograms keep a count per bucket plus the sum and count of observations.
+Metric = namedtuple('Metric', ['name', 'kind', 'help', 'buckets'], defaults=[()])
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+TASK_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+HTTP_REQUEST_DURATION = Metric('parkman_http_request_duration_seconds', 'histogram', 'Time spent building a response, per endpoint', LATENCY_BUCKETS)
+HTTP_RESPONSES = Metric('parkman_http_responses_total', 'counter', 'Responses sent, per endpoint and status code')
+DB_QUERIES_PER_REQUEST = Metric('parkman_db_queries_per_request', 'histogram', 'SQL statements executed while handling one request, per endpoint', QUERY_COUNT_BUCKETS)
+DB_QUERY_DURATION = Metric('parkman_db_query_duration_seconds_total', 'counter', 'Time spent executing SQL statements, per endpoint or task')
+CACHE_LOOKUPS = Metric('parkman_cache_lookups_total', 'counter', 'Redis cache lookups, per key family and result')
+TASK_DURATION = Metric('parkman_task_duration_seconds', 'histogram', 'Time spent running a Celery task', TASK_BUCKETS)
+TASK_QUEUE_LAG = Metric('parkman_task_queue_lag_seconds', 'histogram', 'Time a Celery task waited in the queue after it was due', TASK_BUCKETS)
+TASKS = Metric('parkman_tasks_total', 'counter', 'Celery tasks run, per task and outcome')
+MAIL_REJECTED = Metric('parkman_mail_rejected_total', 'counter', 'Mails the SMTP server refused and that were dropped, per error')
+
+METRICS = [HTTP_REQUEST_DURATION, HTTP_RESPONSES, DB_QUERIES_PER_REQUEST, DB_QUERY_DURATION, CACHE_LOOKUPS, TASK_DURATION, TASK_QUEUE_LAG, TASKS, MAIL_REJECTED]
+
+def metric_key(metric):
+    return f'parking:metrics:{metric.name}'
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in sorted(labels.items()))
+
+# Commands are buffered on a pipeline kept in g for the length of a request
+# or task and sent in one round trip when it ends; elsewhere they go out
+# right away
+@contextmanager
+def metrics_pipeline():
+    if has_app_context() and 'metrics_pipeline' in g:
+        yield g.metrics_pipeline
+        return
+
+    pipeline = r.pipeline(transaction=False)
+    yield pipeline
+    try:
+        pipeline.execute()
+    except redis.RedisError as e:
+        log_failure(e)
+
+def log_failure(error):
+    if has_app_context():
+        current_app.logger.warning('Failed to record metrics: %s', error)
+
+def increment(metric, amount=1, **labels):
+    with metrics_pipeline() as pipeline:
+        pipeline.hincrbyfloat(metric_key(metric), format_labels(labels), amount)
+
+def observe(metric, value, **labels):
+    series = format_labels(labels)
+    bucket = bisect_left(metric.buckets, value)
+
+    with metrics_pipeline() as pipeline:
+        if bucket < len(metric.buckets):
+            pipeline.hincrby(metric_key(metric), f'{series}|{bucket}', 1)
+        pipeline.hincrby(metric_key(metric), f'{series}|count', 1)
+        pipeline.hincrbyfloat(metric_key(metric), f'{series}|sum', value)
+
+# Families are cache keys with their IDs, versions and query strings left
+# out, so parking:lots:7:spots:v123 counts under lots:spots
+def key_family(key):
+    parts = key.split('?', 1)[0].split(':')[1:]
+    return ':'.join(part for part in parts if not part.isdigit() and not (part[:1] == 'v' and part[1:].isdigit()))
+
+def record_cache_lookup(key, hits=0, misses=0):
+    family = key_family(key)
+    if hits:
+        increment(CACHE_LOOKUPS, hits, family=family, result='hit')
+    if misses:
+        increment(CACHE_LOOKUPS, misses, family=family, result='miss')
+
+# Statements are counted against whatever request or task holds the app
+# context, which is where start_tracking left its counters
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(connection, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(connection, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'query_count' in g:
+        g.query_count += 1
+        g.query_seconds += time.perf_counter() - getattr(context, 'metrics_started', time.perf_counter())
+
+def start_tracking():
+    g.metrics_started = time.perf_counter()
+    g.metrics_pipeline = r.pipeline(transaction=False)
+    g.query_count = 0
+    g.query_seconds = 0.0
+
+def finish_tracking(**labels):
+    if g.query_count:
+        increment(DB_QUERY_DURATION, g.query_seconds, **labels)
+
+    pipeline = g.pop('metrics_pipeline')
+    try:
+        pipeline.execute()
+    except redis.RedisError as e:
+        log_failure(e)
+
+# Streamed responses are timed up to their first byte
+def after_request(response):
+    if 'metrics_pipeline' not in g:
+        return response
+
+    endpoint = request.endpoint or 'unmatched'
+    observe(HTTP_REQUEST_DURATION, time.perf_counter() - g.metrics_started, endpoint=endpoint, method=request.method)
+    increment(HTTP_RESPONSES, endpoint=endpoint, method=request.method, status=response.status_code)
+    observe(DB_QUERIES_PER_REQUEST, g.query_count, endpoint=endpoint)
+    finish_tracking(endpoint=endpoint)
+    return response
+
+def init_metrics(app):
+    app.before_request(start_tracking)
+    app.after_request(after_request)
+
+# When a task was due: when it was published (see celery_worker), or its
+# ETA if it was scheduled for later. Tasks run eagerly have neither.
+def task_due_at(task_request):
+    published_at = task_request.get('published_at')
+    if not published_at:
+        return None
+
+    eta = task_request.eta
+    if isinstance(eta, str):
+        eta = datetime.fromisoformat(eta)
+    return max(published_at, eta.timestamp()) if eta else published_at
+
+# Runs a task inside its app context, recording its outcome, duration,
+# queue lag and SQL time
+def track_task(task, run):
+    start_tracking()
+    due_at = task_due_at(task.request)
+    if due_at:
+        observe(TASK_QUEUE_LAG, max(0.0, time.time() - due_at), task=task.name)
+
+    outcome = 'failure'
+    try:
+        result = run()
+        outcome = 'success'
+        return result
+    finally:
+        increment(TASKS, task=task.name, outcome=outcome)
+        observe(TASK_DURATION, time.perf_counter() - g.metrics_started, task=task.name)
+        finish_tracking(task=task.name)
+
+def format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+# Prometheus text exposition format, version 0.0.4
+def render_metrics():
+    pipeline = r.pipeline(transaction=False)
+    for metric in METRICS:
+        pipeline.hgetall(metric_key(metric))
+
+    lines = []
+    for metric, values in zip(METRICS, pipeline.execute()):
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+
+        if metric.kind == 'counter':
+            for series, value in sorted(values.items()):
+                series = series.decode()
+                lines.append(f'{metric.name}{{{series}}} {format_value(value)}' if series else f'{metric.name} {format_value(value)}')
+            continue
+
+        histograms = defaultdict(dict)
+        for field, value in values.items():
+            series, part = field.decode().rsplit('|', 1)
+            histograms[series][part] = value
+
+        for series, parts in sorted(histograms.items()):
+            prefix = f'{series},' if series else ''
+            cumulative = 0
+            for index, bound in enumerate(metric.buckets):
+                cumulative += int(parts.get(str(index), 0))
+                lines.append(f'{metric.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{metric.name}_bucket{{{prefix}le="+Inf"}} {format_value(parts.get("count", 0))}')
+
+            suffix = f'{{{series}}}' if series else ''
+            lines.append(f'{metric.name}_sum{suffix} {format_value(parts.get("sum", 0))}')
+            lines.append(f'{metric.name}_count{suffix} {format_value(parts.get("count", 0))}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta, time
+from itertools import chain
+from sqlalchemy import select, cast, func, BigInteger, Integer
+from extensions.extensions import db
+import sys
+
+sys.path.append('..')
+
+from models.models import LotDailyStats, LotHourlyStats, ParkingSpots, Reservations
+
+MAX_OCCUPANCY_DAYS = 366
+
+EPOCH = datetime(1970, 1, 1)
+
+# numpy is imported inside the functions that use it: the controllers import
+# this module, and the web process should only load numpy on the first
+# occupancy request
+
+# Timestamps are stored as naive local times; reading them as seconds since
+# a naive epoch keeps their wall-clock hour and weekday. unixepoch() parses
+# faster than strftime() but needs SQLite 3.38.
+def epoch_seconds(column):
+    if db.engine.dialect.name == 'sqlite':
+        if db.engine.dialect.dbapi.sqlite_version_info >= (3, 38):
+            return func.unixepoch(column)
+        return cast(func.strftime('%s', column), Integer)
+    return cast(func.extract('epoch', column), BigInteger)
+
+def to_minutes(timestamp):
+    return int((timestamp - EPOCH).total_seconds()) // 60
+
+def from_minutes(minutes):
+    return EPOCH + timedelta(minutes=int(minutes))
+
+# Runs a query of integer columns into one NumPy array per column. Rows are
+# flattened straight into the array: np.array() on Row objects probes each
+# one as a mapping and is many times slower.
+def fetch_columns(statement, columns):
+    import numpy as np
+
+    rows = db.session.execute(statement).fetchall()
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=columns * len(rows)).reshape(-1, columns).T
+
+# Stays of a lot as start and end minutes since the epoch; open ones end now
+def load_intervals(lot_id, *criteria):
+    statement = select(epoch_seconds(Reservations.parking_timestamp), func.coalesce(epoch_seconds(Reservations.leaving_timestamp), to_minutes(datetime.now()) * 60)) \
+    .join(ParkingSpots, ParkingSpots.id == Reservations.spot_id) \
+    .where(ParkingSpots.lot_id == lot_id, *criteria)
+
+    starts, ends = fetch_columns(statement, 2) // 60
+    return starts, ends
+
+# Occupied spot-minutes in each of `hours` hours from first_hour (counted
+# from the epoch), swept from stay boundaries with no per-minute grid: the
+# running count of arrivals less departures fills whole hours, and minutes
+# before an arrival or after a departure within an hour are taken off or
+# added back
+def occupied_minutes_per_hour(starts, ends, first_hour, hours):
+    import numpy as np
+
+    first_minute, last_minute = first_hour * 60, (first_hour + hours) * 60
+    starts = np.clip(starts, first_minute, last_minute) - first_minute
+    ends = np.clip(ends, first_minute, last_minute) - first_minute
+    overlapping = ends > starts
+    starts, ends = starts[overlapping], ends[overlapping]
+
+    in_progress = np.cumsum(np.bincount(starts // 60, minlength=hours + 1) - np.bincount(ends // 60, minlength=hours + 1))
+    minutes_before_arrivals = np.bincount(starts // 60, weights=starts % 60, minlength=hours + 1)
+    minutes_after_departures = np.bincount(ends // 60, weights=ends % 60, minlength=hours + 1)
+
+    return (in_progress * 60 - minutes_before_arrivals + minutes_after_departures)[:hours].astype(np.int64)
+
+def percentages(occupied_minutes, available_minutes):
+    import numpy as np
+
+    rates = np.divide(occupied_minutes, available_minutes, out=np.zeros(len(occupied_minutes)), where=available_minutes > 0)
+    return np.round(rates * 100, 2).tolist()
+
+# Utilization of a lot from the first to the last day given, by day, by hour
+# of day, by weekday (Monday first) and as a weekday x hour heatmap. Completed
+# stays come from the hourly rollup, stays in progress are swept on top.
+def lot_occupancy(lot_id, number_of_spots, first_day, last_day):
+    import numpy as np
+
+    start = datetime.combine(first_day, time())
+    end = datetime.combine(last_day + timedelta(days=1), time())
+    first_hour = to_minutes(start) // 60
+    days = (end - start).days
+    hours = days * 24
+
+    hour_seconds, minutes = fetch_columns(select(epoch_seconds(LotHourlyStats.hour), LotHourlyStats.occupied_minutes).where(LotHourlyStats.lot_id == lot_id, LotHourlyStats.hour >= start, LotHourlyStats.hour < end), 2)
+    occupied_per_hour = np.zeros(hours, dtype=np.int64)
+    occupied_per_hour[hour_seconds // 3600 - first_hour] = minutes
+
+    # An IN list, unlike !=, lets the spot_id/status index seek past completed
+    # stays; any filter on parking_timestamp draws SQLite onto a worse index
+    starts, ends = load_intervals(lot_id, Reservations.status.in_(['pending', 'active']))
+    occupied_per_hour += occupied_minutes_per_hour(starts, ends, first_hour, hours)
+
+    # 1970-01-01 was a Thursday, so Monday-first weekdays are offset by 3
+    weekdays = (np.arange(days) + (start - EPOCH).days + 3) % 7
+    cells = np.repeat(weekdays, 24) * 24 + np.tile(np.arange(24), days)
+    hour_capacity = 60 * number_of_spots
+    occupied_per_cell = np.bincount(cells, weights=occupied_per_hour, minlength=7 * 24).reshape(7, 24)
+    capacity_per_cell = np.bincount(cells, minlength=7 * 24).reshape(7, 24) * hour_capacity
+
+    # Peaks are recorded nightly once a day is over; today's is swept live
+    peak_occupancy = db.session.query(func.max(LotDailyStats.peak_occupancy)).filter(LotDailyStats.lot_id == lot_id, LotDailyStats.day >= first_day, LotDailyStats.day <= last_day).scalar() or 0
+    today = date.today()
+    if first_day <= today <= last_day:
+        from helpers.lot_stats import day_peaks
+        peak_occupancy = max(peak_occupancy, day_peaks(today, ParkingSpots.lot_id == lot_id).get(lot_id, 0))
+
+    return {
+        'utilization': percentages(occupied_per_hour.sum(keepdims=True), np.array([hours * hour_capacity]))[0],
+        'peak_occupancy': peak_occupancy,
+        'days': [(first_day + timedelta(days=day)).isoformat() for day in range(days)],
+        'by_day': percentages(occupied_per_hour.reshape(days, 24).sum(axis=1), np.full(days, 24 * hour_capacity)),
+        'by_hour': percentages(occupied_per_cell.sum(axis=0), capacity_per_cell.sum(axis=0)),
+        'by_weekday': percentages(occupied_per_cell.sum(axis=1), capacity_per_cell.sum(axis=1)),
+        'heatmap': [percentages(occupied, capacity) for occupied, capacity in zip(occupied_per_cell, capacity_per_cell)]
+    }
@@ -0,0 +1,51 @@
+from flask import request
+from sqlalchemy import or_, and_
+from datetime import datetime
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def page_size():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+# Cursors are opaque to clients: base64-encoded JSON of the sort key of
+# the last row on the previous page
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+# Anything that doesn't decode to one value of each given type, in order,
+# raises ValueError
+def decode_cursor(cursor, *types):
+    values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    if not isinstance(values, list) or len(values) != len(types) or not all(type(value) is value_type for value, value_type in zip(values, types)):
+        raise ValueError('Invalid cursor')
+    return values
+
+# Seeks past the cursor on an ascending primary key, returning one page of
+# rows and the cursor for the next page (None on the last page)
+def paginate_by_id(query, id_column, cursor, limit):
+    if cursor:
+        last_id, = decode_cursor(cursor, int)
+        query = query.filter(id_column > last_id)
+
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    next_cursor = encode_cursor([rows[limit - 1].id]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+# Same, newest first on (timestamp, id) so rows sharing a timestamp are
+# neither skipped nor repeated
+def paginate_by_timestamp(query, timestamp_column, id_column, cursor, limit):
+    if cursor:
+        last_timestamp, last_id = decode_cursor(cursor, str, int)
+        last_timestamp = datetime.fromisoformat(last_timestamp)
+        query = query.filter(or_(timestamp_column < last_timestamp, and_(timestamp_column == last_timestamp, id_column < last_id)))
+
+    rows = query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor([getattr(last, timestamp_column.key).isoformat(), last.id])
+    return rows[:limit], next_cursor
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import threading
+import bcrypt
+
+# bcrypt releases the GIL, so a small pool bounds how many cores hashing can
+# take no matter how many requests are logging in; the rest of the API keeps
+# its threads and CPU. Requests beyond the pool and its queue are turned away.
+class PasswordHasherBusy(Exception):
+    pass
+
+pool = None
+slots = None
+pool_lock = threading.Lock()
+
+def get_pool():
+    global pool, slots
+    with pool_lock:
+        if pool is None:
+            workers = current_app.config['PASSWORD_HASH_WORKERS']
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+            slots = threading.BoundedSemaphore(workers + current_app.config['PASSWORD_HASH_MAX_PENDING'])
+    return pool, slots
+
+def run_in_pool(fn, *args):
+    pool, slots = get_pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+
+    try:
+        future = pool.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future.result()
+
+def hash_password(password):
+    rounds = current_app.config['BCRYPT_LOG_ROUNDS']
+    return run_in_pool(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8'))
+
+def check_password(password, hashed_password):
+    return run_in_pool(bcrypt.checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+# Hashes look like $2b$12$..., the middle field being the cost they were made with
+def needs_rehash(hashed_password):
+    return int(hashed_password.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
@@ -0,0 +1,102 @@
+from flask import Response, request, make_response
+from functools import wraps
+from zlib import crc32
+from helpers.clear_redis_cache import r, get_version, versioned_key
+from helpers.metrics import record_cache_lookup
+import redis
+import secrets
+import time
+
+LOCK_TIMEOUT_MS = 10000
+LOCK_WAIT_SECONDS = 2.0
+
+# Payloads are stored pre-encoded as b'<status> <content type>\n<body>' so
+# a hit is returned verbatim without decoding and re-serializing JSON
+def pack_response(response):
+    return f'{response.status_code} {response.content_type}\n'.encode() + response.get_data()
+
+def unpack_response(payload):
+    header, body = payload.split(b'\n', 1)
+    status, content_type = header.decode().split(' ', 1)
+    return Response(body, status=int(status), content_type=content_type)
+
+def cached_response(cache_key):
+    payload = r.get(cache_key)
+    return unpack_response(payload) if payload is not None else None
+
+# Only one request rebuilds an expired payload; concurrent misses wait
+# briefly for it instead of all hitting the database. The lock holds a
+# token of its own, so a render that outlives LOCK_TIMEOUT_MS can't release
+# the lock another request has taken since.
+def render_once(cache_key, ttl, view, *args, **kwargs):
+    lock_key = f'{cache_key}:lock'
+    token = secrets.token_hex(16)
+    locked = r.set(lock_key, token, nx=True, px=LOCK_TIMEOUT_MS)
+
+    if not locked:
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = cached_response(cache_key)
+            if response is not None:
+                return response
+
+    try:
+        # The request that held the lock before may have just filled the cache
+        response = cached_response(cache_key) if locked else None
+        if response is not None:
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            r.set(cache_key, pack_response(response), ex=ttl)
+        return response
+    finally:
+        if locked:
+            release_lock(lock_key, token)
+
+# Deletes the lock only while it still holds our token
+def release_lock(lock_key, token):
+    with r.pipeline() as pipeline:
+        try:
+            pipeline.watch(lock_key)
+            if pipeline.get(lock_key) == token.encode():
+                pipeline.multi()
+                pipeline.delete(lock_key)
+                pipeline.execute()
+        except redis.WatchError:
+            pass
+
+# Caches a GET endpoint, per query string (page), under its resource's
+# current version and answers If-None-Match from the version counter alone
+def cached(resource_key, ttl=60):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = resource_key(*args, **kwargs)
+            version = get_version(key)
+            page = f'{key}?{request.query_string.decode()}'
+            etag = f'{crc32(page.encode()):08x}-{version}'
+
+            if request.if_none_match.contains(etag):
+                record_cache_lookup(key, hits=1)
+                response = make_response('', 304)
+            else:
+                cache_key = versioned_key(key, version)
+                if request.query_string:
+                    cache_key = f'{cache_key}:{request.query_string.decode()}'
+                response = cached_response(cache_key)
+                if response is not None:
+                    record_cache_lookup(key, hits=1)
+                else:
+                    record_cache_lookup(key, misses=1)
+                    response = render_once(cache_key, ttl, view, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
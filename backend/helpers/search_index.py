@@ -0,0 +1,102 @@
+from sqlalchemy import text, and_, or_, func
+from extensions.extensions import db
+
+# Searchable columns per table; fuzzy matching is only worth it on free text,
+# emails and pincodes share too many trigrams for it to rank anything useful
+SEARCH_COLUMNS = {
+    'parking_lots': {'prime_location_name': True, 'pincode': False},
+    'users': {'name': True, 'email': False}
+}
+
+# SQLite keeps a trigram FTS5 table beside each searchable table, filled by
+# triggers so every insert, update and delete (ORM or not) stays in sync.
+# Postgres gets pg_trgm GIN indexes, which ILIKE and similarity both use.
+def create_search_index():
+    dialect = db.engine.dialect.name
+    tables = {table: columns for table, columns in SEARCH_COLUMNS.items() if table in db.metadata.tables}
+
+    with db.engine.begin() as connection:
+        if dialect == 'sqlite':
+            for table, columns in tables.items():
+                fts = f'{table}_fts'
+                names = ', '.join(columns)
+                new_values = ', '.join(f'new.{column}' for column in columns)
+                old_values = ', '.join(f'old.{column}' for column in columns)
+
+                exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts}).first()
+                connection.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', content_rowid='id', tokenize='trigram')"))
+                connection.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END"))
+                connection.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END"))
+                connection.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END"))
+
+                # Index rows that were there before the search table was
+                if not exists:
+                    connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        elif dialect == 'postgresql':
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            for table, columns in tables.items():
+                for column in columns:
+                    connection.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops)'))
+
+def rebuild_search_index():
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as connection:
+            for table in SEARCH_COLUMNS:
+                connection.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+
+# Prefix match as an index range scan; LIKE 'term%' cannot use a plain index
+# on SQLite because LIKE there is case-insensitive
+def prefix_filter(column, prefix):
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+def fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def trigrams(term):
+    term = term.lower()
+    return list(dict.fromkeys(term[i:i + 3] for i in range(len(term) - 2)))
+
+def search_ids(column, term, limit):
+    table = column.table.name
+    fuzzy = SEARCH_COLUMNS[table][column.key]
+    fts = f'{table}_fts'
+    statement = text(f'SELECT rowid FROM {fts} WHERE {fts} MATCH :query ORDER BY rank LIMIT :limit')
+
+    # Substring matches first, like the ILIKE scan this replaces, ranked by bm25
+    ids = [id for id, in db.session.execute(statement, {'query': f'{column.key} : {fts_phrase(term)}', 'limit': limit})]
+
+    # Then close matches sharing the most trigrams with the term, to absorb typos
+    if fuzzy and len(ids) < limit and len(term) > 3:
+        query = ' OR '.join(fts_phrase(trigram) for trigram in trigrams(term))
+        for id, in db.session.execute(statement, {'query': f'{column.key} : ({query})', 'limit': limit}):
+            if id not in ids:
+                ids.append(id)
+                if len(ids) == limit:
+                    break
+
+    return ids
+
+# Ranked, limited search on one column of a model. Terms shorter than a
+# trigram cannot use the index, but the LIMIT stops their scan early.
+def search(model, column, term, limit):
+    dialect = db.session.get_bind().dialect.name
+    pattern = f'%{term}%'
+
+    if dialect == 'sqlite' and len(term) >= 3:
+        ids = search_ids(column, term, limit)
+        if not ids:
+            return []
+        rows = {row.id: row for row in model.query.filter(model.id.in_(ids))}
+        return [rows[id] for id in ids if id in rows]
+
+    if dialect == 'postgresql':
+        query = model.query.filter(or_(column.ilike(pattern), column.op('%')(term)) if SEARCH_COLUMNS[column.table.name][column.key] else column.ilike(pattern))
+        return query.order_by(column.ilike(pattern).desc(), func.similarity(column, term).desc(), model.id).limit(limit).all()
+
+    return model.query.filter(column.ilike(pattern)).order_by(model.id).limit(limit).all()
+
+if __name__ == '__main__':
+    from app_factory import get_app
+
+    with get_app().app_context():
+        rebuild_search_index()
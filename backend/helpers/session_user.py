@@ -0,0 +1,43 @@
+from collections import namedtuple
+from flask_login import UserMixin
+import json
+import redis
+import sys
+
+sys.path.append('..')
+
+from models.models import Users
+from helpers.metrics import record_cache_lookup
+
+r = redis.Redis()
+
+SESSION_USER_TTL = 60
+
+# Read-only stand-in for the Users row behind current_user, so authenticated
+# requests don't query the database just to learn who is asking
+class SessionUser(UserMixin, namedtuple('SessionUser', ['id', 'email', 'name', 'address', 'pincode', 'is_admin'])):
+    __slots__ = ()
+
+def session_user_key(user_id):
+    return f'parking:users:{user_id}:session'
+
+def load_session_user(user_id):
+    cached_user = r.get(session_user_key(user_id))
+    if cached_user is not None:
+        record_cache_lookup(session_user_key(user_id), hits=1)
+        return SessionUser(**json.loads(cached_user))
+
+    record_cache_lookup(session_user_key(user_id), misses=1)
+
+    user = Users.query.get(user_id)
+    if not user:
+        return None
+
+    session_user = SessionUser(user.id, user.email, user.name, user.address, user.pincode, bool(user.is_admin))
+    r.set(session_user_key(user_id), json.dumps(session_user._asdict()), ex=SESSION_USER_TTL)
+    return session_user
+
+# User edited or deleted; the TTL bounds how long a snapshot read just before
+# the write can outlive it
+def invalidate_session_user(user_id):
+    r.delete(session_user_key(user_id))
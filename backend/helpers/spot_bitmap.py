@@ -0,0 +1,57 @@
+from extensions.extensions import db
+from models.models import ParkingSpots
+from helpers.clear_redis_cache import r, spots_key, get_versions, versioned_key
+from helpers.metrics import record_cache_lookup
+import base64
+import json
+
+STATUS_CODES = {'available': 0, 'occupied': 1, 'unavailable': 2}
+STATUSES = list(STATUS_CODES)
+
+# Packs a lot's spots, ordered by ID, into [first_id, count] runs of
+# consecutive IDs plus a base64 string of 2-bit statuses, four per byte
+def encode_spots(spots):
+    ranges = []
+    states = bytearray((len(spots) + 3) // 4)
+
+    for index, (spot_id, status) in enumerate(spots):
+        if ranges and ranges[-1][0] + ranges[-1][1] == spot_id:
+            ranges[-1][1] += 1
+        else:
+            ranges.append([spot_id, 1])
+        states[index // 4] |= STATUS_CODES.get(status, 0) << (index % 4) * 2
+
+    return {'ranges': ranges, 'states': base64.b64encode(bytes(states)).decode()}
+
+def packed_key(lot_id, version):
+    return f'{versioned_key(spots_key(lot_id), version)}:packed'
+
+# Packed spot states for many lots, read from Redis in one MGET and with a
+# single query for the lots that are not cached yet
+def packed_lot_spots(lot_ids, ttl=60):
+    versions = get_versions([spots_key(lot_id) for lot_id in lot_ids])
+    keys = [packed_key(lot_id, version) for lot_id, version in zip(lot_ids, versions)]
+
+    lots_data = {}
+    missing = {}
+    for lot_id, key, payload in zip(lot_ids, keys, r.mget(keys)):
+        if payload is not None:
+            lots_data[lot_id] = json.loads(payload)
+        else:
+            missing[lot_id] = key
+
+    if keys:
+        record_cache_lookup(keys[0], hits=len(lots_data), misses=len(missing))
+
+    if missing:
+        spots = {lot_id: [] for lot_id in missing}
+        for spot_id, lot_id, status in db.session.query(ParkingSpots.id, ParkingSpots.lot_id, ParkingSpots.status).filter(ParkingSpots.lot_id.in_(missing)).order_by(ParkingSpots.lot_id, ParkingSpots.id):
+            spots[lot_id].append((spot_id, status))
+
+        pipeline = r.pipeline(transaction=False)
+        for lot_id, key in missing.items():
+            lots_data[lot_id] = encode_spots(spots[lot_id])
+            pipeline.set(key, json.dumps(lots_data[lot_id]), ex=ttl)
+        pipeline.execute()
+
+    return lots_data
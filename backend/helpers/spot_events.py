@@ -0,0 +1,55 @@
+import redis
+import json
+
+r = redis.Redis()
+
+SPOT_EVENTS_KEY = 'parking:events:spots'
+SPOT_EVENTS_MAXLEN = 10000
+
+# Spot status changes are appended to a capped Redis stream; the stream
+# entry ID doubles as the SSE event ID clients resume from
+def publish_spot_status(lot_id, spot_id, status):
+    r.xadd(SPOT_EVENTS_KEY, {'type': 'spot', 'lot_id': lot_id, 'id': spot_id, 'status': status}, maxlen=SPOT_EVENTS_MAXLEN, approximate=True)
+
+# Spots were added to or removed from the lot, clients reload its spot list
+def publish_lot_reset(lot_id):
+    r.xadd(SPOT_EVENTS_KEY, {'type': 'reset', 'lot_id': lot_id}, maxlen=SPOT_EVENTS_MAXLEN, approximate=True)
+
+def publish_lot_resets(lot_ids):
+    pipeline = r.pipeline(transaction=False)
+    for lot_id in lot_ids:
+        pipeline.xadd(SPOT_EVENTS_KEY, {'type': 'reset', 'lot_id': lot_id}, maxlen=SPOT_EVENTS_MAXLEN, approximate=True)
+    pipeline.execute()
+
+def parse_event_id(event_id):
+    milliseconds, sequence = event_id.split('-')
+    return int(milliseconds), int(sequence)
+
+# A client can only resume from a cursor the capped stream still holds
+def can_resume(event_id):
+    first = r.xrange(SPOT_EVENTS_KEY, count=1)
+    if not first:
+        return False
+
+    try:
+        return parse_event_id(event_id) >= parse_event_id(first[0][0].decode())
+    except ValueError:
+        return False
+
+def last_event_id():
+    last = r.xrevrange(SPOT_EVENTS_KEY, count=1)
+    return last[0][0].decode() if last else '0-0'
+
+def read_spot_events(last_id, block=15000):
+    streams = r.xread({SPOT_EVENTS_KEY: last_id}, block=block, count=500)
+    for _, entries in streams:
+        for entry_id, fields in entries:
+            event = {key.decode(): value.decode() for key, value in fields.items()}
+            event['lot_id'] = int(event['lot_id'])
+            if 'id' in event:
+                event['id'] = int(event['id'])
+            yield entry_id.decode(), event
+
+def format_sse(event, data, event_id=None):
+    message = f'event: {event}\ndata: {json.dumps(data)}\n\n'
+    return f'id: {event_id}\n{message}' if event_id else message
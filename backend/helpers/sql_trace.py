@@ -0,0 +1,155 @@
+from collections import namedtuple, defaultdict, Counter
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import traceback
+import time
+import os
+import re
+
+# Opt-in profiling for development and staging (SQL_TRACE=1). Every SQL
+# statement run for a request or task is recorded with its duration and the
+# project frames that issued it. Statements of the same shape run
+# SQL_TRACE_N_PLUS_ONE times or more are flagged as N+1 patterns, and
+# statements slower than SQL_TRACE_SLOW_MS are explained. The report goes to
+# the app log and its summary to an X-SQL-Trace response header.
+TracedStatement = namedtuple('TracedStatement', ['shape', 'seconds', 'call_site', 'plan'])
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LISTED_STATEMENTS = 50
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+# IN lists and multi-row VALUES render one placeholder per item; collapsed,
+# the same query with a different number of items has one shape
+PLACEHOLDER_RUN = re.compile(r'(\?|%\(\w+\)s)(\s*,\s*(\?|%\(\w+\)s))+')
+ROW_RUN = re.compile(r'(\(\?\))(\s*,\s*\(\?\))+')
+
+def statement_shape(statement):
+    shape = PLACEHOLDER_RUN.sub('?', ' '.join(statement.split()))
+    return ROW_RUN.sub('(?)', shape)
+
+# Innermost frames from this codebase, skipping libraries and this file
+def call_site(depth=3):
+    frames = [frame for frame in traceback.extract_stack() if frame.filename.startswith(PROJECT_ROOT) and frame.filename != __file__ and 'site-packages' not in frame.filename]
+    return [f'{os.path.relpath(frame.filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}' for frame in frames[-depth:]]
+
+def explain(connection, statement, parameters):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.sql_trace_started = time.perf_counter()
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    if not (has_app_context() and 'sql_trace' in g) or not hasattr(context, 'sql_trace_started'):
+        return
+
+    seconds = time.perf_counter() - context.sql_trace_started
+    plan = None
+    if seconds * 1000 >= current_app.config['SQL_TRACE_SLOW_MS'] and not executemany and statement.lstrip().upper().startswith('SELECT'):
+        plan = explain(connection, statement, parameters)
+
+    g.sql_trace.append(TracedStatement(statement_shape(statement), seconds, call_site(), plan))
+
+def start_trace():
+    g.sql_trace = []
+
+# N+1 groups (statement shapes run at least `threshold` times) with their
+# count, total time and most frequent call site, worst first
+def repeated_shapes(statements, threshold):
+    groups = defaultdict(list)
+    for traced in statements:
+        groups[traced.shape].append(traced)
+
+    repeated = []
+    for shape, group in groups.items():
+        if len(group) >= threshold:
+            sites = Counter(tuple(traced.call_site) for traced in group)
+            repeated.append((shape, len(group), sum(traced.seconds for traced in group), list(sites.most_common(1)[0][0])))
+    return sorted(repeated, key=lambda item: item[1], reverse=True)
+
+def finish_trace(label):
+    statements = g.pop('sql_trace', None)
+    if statements is None:
+        return None
+
+    repeated = repeated_shapes(statements, current_app.config['SQL_TRACE_N_PLUS_ONE'])
+    slow = [traced for traced in statements if traced.plan is not None]
+    total_ms = sum(traced.seconds for traced in statements) * 1000
+
+    lines = [f'SQL trace for {label}: {len(statements)} statements in {total_ms:.1f} ms']
+    for shape, count, seconds, site in repeated:
+        lines.append(f'  N+1: {count}x in {seconds * 1000:.1f} ms: {shape}')
+        lines.extend(f'    at {frame}' for frame in site)
+    for traced in slow:
+        lines.append(f'  Slow: {traced.seconds * 1000:.1f} ms: {traced.shape}')
+        lines.extend(f'    at {frame}' for frame in traced.call_site)
+        lines.extend(f'    plan: {row}' for row in traced.plan)
+    for index, traced in enumerate(statements[:LISTED_STATEMENTS], 1):
+        lines.append(f'  {index}. {traced.seconds * 1000:.2f} ms {traced.call_site[-1] if traced.call_site else "-"}: {traced.shape}')
+    if len(statements) > LISTED_STATEMENTS:
+        lines.append(f'  ... and {len(statements) - LISTED_STATEMENTS} more')
+
+    log = current_app.logger.warning if repeated or slow else current_app.logger.info
+    log('\n'.join(lines))
+
+    return f'statements={len(statements)}; time_ms={total_ms:.1f}; n_plus_one={len(repeated)}; slow={len(slow)}'
+
+def after_request(response):
+    summary = finish_trace(f'{request.method} {request.path} ({request.endpoint})')
+    if summary:
+        response.headers['X-SQL-Trace'] = summary
+    return response
+
+# Runs a Celery task under the trace, inside its app context
+def trace_task(task, run):
+    if not current_app.config['SQL_TRACE']:
+        return run()
+
+    start_trace()
+    try:
+        return run()
+    finally:
+        finish_trace(f'task {task.name}')
+
+def init_sql_trace(app):
+    if not app.config['SQL_TRACE']:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    app.before_request(start_trace)
+    app.after_request(after_request)
+
+# Fails the enclosed code if it runs more than `limit` statements, listing
+# what ran. Works whether or not SQL_TRACE is on; tests get it through the
+# query_budget fixture in tests/conftest.py.
+@contextmanager
+def query_budget(limit):
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement_shape(statement), call_site()))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+
+    if len(statements) > limit:
+        listing = '\n'.join(f'  {shape}\n    at {site[-1] if site else "-"}' for shape, site in statements)
+        raise QueryBudgetExceeded(f'{len(statements)} statements exceeded the budget of {limit}:\n{listing}')
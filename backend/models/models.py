@@ -1,8 +1,14 @@
 from extensions.extensions import db
 from flask_login import UserMixin
+from sqlalchemy import select, insert, update, delete
 from datetime import datetime
 from pytz import timezone
 
+IST = timezone('Asia/Kolkata')
+
+def format_ist(timestamp):
+    return timestamp.astimezone(IST).strftime("%A, %d %B %Y at %-I:%M %p") if timestamp else None
+
 class Users(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
@@ -32,13 +38,14 @@ class ParkingLots(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     prime_location_name = db.Column(db.String(100), nullable=False)
     address = db.Column(db.String(500), nullable=False)
-    pincode = db.Column(db.String(7), nullable=False)
+    pincode = db.Column(db.String(7), nullable=False, index=True)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     number_of_spots = db.Column(db.Integer, nullable=False)
     spots = db.relationship(
         'ParkingSpots',
         backref='parking_lot',
-        cascade='all, delete-orphan'
+        cascade='all, delete-orphan',
+        order_by='ParkingSpots.id'
     )
 
     def to_dict(self):
@@ -61,6 +68,10 @@ class ParkingSpots(db.Model):
         cascade='all, delete-orphan'
     )
 
+    __table_args__ = (
+        db.Index('ix_parking_spots_lot_id_status', 'lot_id', 'status'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -68,31 +79,147 @@ class ParkingSpots(db.Model):
             'status': self.status
         }
 
+    # Marks an available spot in the lot as occupied, preferring spot_id,
+    # and returns its ID (None when the lot is full)
+    @staticmethod
+    def claim(lot_id, spot_id=None):
+        spots = ParkingSpots.__table__
+        candidate = select(spots.c.id).where(spots.c.lot_id == lot_id, spots.c.status == 'available')
+        if spot_id:
+            candidate = candidate.order_by((spots.c.id == spot_id).desc(), spots.c.id)
+        else:
+            candidate = candidate.order_by(spots.c.id)
+        candidate = candidate.limit(1).with_for_update(skip_locked=True)
+
+        if db.engine.dialect.update_returning:
+            claim = update(spots).where(spots.c.id == candidate.scalar_subquery(), spots.c.status == 'available').values(status='occupied').returning(spots.c.id)
+            return db.session.execute(claim).scalar()
+
+        for _ in range(5):
+            candidate_id = db.session.execute(candidate).scalar()
+            if candidate_id is None:
+                return None
+
+            claim = update(spots).where(spots.c.id == candidate_id, spots.c.status == 'available').values(status='occupied')
+            if db.session.execute(claim).rowcount == 1:
+                return candidate_id
+        return None
+
+    # Adds available spots to each lot ({lot_id: count}) in one batched
+    # executemany INSERT instead of an ORM object per spot
+    @staticmethod
+    def provision(spot_counts):
+        rows = [{'lot_id': lot_id, 'status': 'available'} for lot_id, count in spot_counts.items() for _ in range(count)]
+        if rows:
+            db.session.execute(insert(ParkingSpots.__table__), rows)
+
+    # Deletes up to count of the lot's highest-numbered unoccupied spots in a
+    # single DELETE (their reservations go with them through the cascading
+    # foreign key) and returns how many were deleted
+    @staticmethod
+    def remove_unoccupied(lot_id, count):
+        spots = ParkingSpots.__table__
+        removable = select(spots.c.id).where(spots.c.lot_id == lot_id, spots.c.status != 'occupied').order_by(spots.c.id.desc()).limit(count)
+        return db.session.execute(delete(spots).where(spots.c.id.in_(removable))).rowcount
+
 class Reservations(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-    parking_timestamp = db.Column(db.DateTime, default=datetime.now())
+    parking_timestamp = db.Column(db.DateTime, default=datetime.now, index=True)
     leaving_timestamp = db.Column(db.DateTime)
     parking_cost = db.Column(db.Numeric(10, 2), nullable=False)
     status = db.Column(db.String(9), default='pending')
-    vehicle_number = db.Column(db.String(11), nullable=False)
-
-    def to_dict(self):
-        ist = timezone('Asia/Kolkata')
+    vehicle_number = db.Column(db.String(11), nullable=False, index=True)
 
-        parking_time = self.parking_timestamp.astimezone(ist).strftime("%A, %d %B %Y at %-I:%M %p") if self.parking_timestamp else None
-        leaving_time = self.leaving_timestamp.astimezone(ist).strftime("%A, %d %B %Y at %-I:%M %p") if self.leaving_timestamp else None
+    __table_args__ = (
+        db.Index('ix_reservations_user_id_status', 'user_id', 'status'),
+        db.Index('ix_reservations_spot_id_status', 'spot_id', 'status'),
+    )
 
+    def to_dict(self):
         return {
             'id': self.id,
             'spot_id': self.spot_id,
             'user_id': self.user_id,
-            'parking_timestamp': parking_time,
-            'leaving_timestamp': leaving_time,
+            'parking_timestamp': format_ist(self.parking_timestamp),
+            'leaving_timestamp': format_ist(self.leaving_timestamp),
             'parking_cost': self.parking_cost,
             'status': self.status,
             'vehicle_number': self.vehicle_number,
             'location': self.spot.parking_lot.prime_location_name,
             'address': self.spot.parking_lot.address
-        }
\ No newline at end of file
+        }
+
+    # Reservation, spot and lot columns fetched in one joined query
+    @staticmethod
+    def history_query():
+        return db.session.query(
+            Reservations.id,
+            Reservations.spot_id,
+            Reservations.user_id,
+            Reservations.parking_timestamp,
+            Reservations.leaving_timestamp,
+            Reservations.parking_cost,
+            Reservations.status,
+            Reservations.vehicle_number,
+            ParkingLots.id.label('lot_id'),
+            ParkingLots.prime_location_name,
+            ParkingLots.address
+        ).join(ParkingSpots, ParkingSpots.id == Reservations.spot_id).join(ParkingLots, ParkingLots.id == ParkingSpots.lot_id)
+
+    @staticmethod
+    def row_to_dict(row):
+        return {
+            'id': row.id,
+            'spot_id': row.spot_id,
+            'user_id': row.user_id,
+            'parking_timestamp': format_ist(row.parking_timestamp),
+            'leaving_timestamp': format_ist(row.leaving_timestamp),
+            'parking_cost': row.parking_cost,
+            'status': row.status,
+            'vehicle_number': row.vehicle_number,
+            'location': row.prime_location_name,
+            'address': row.address
+        }
+
+# Per lot, per day rollup of reservation activity, kept up to date as
+# reservations are completed, with each day's peak occupancy recorded once
+# the day is over (see helpers.lot_stats)
+class LotDailyStats(db.Model):
+    __tablename__ = 'lot_daily_stats'
+
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    occupied_minutes = db.Column(db.Integer, nullable=False, default=0)
+    peak_occupancy = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'lot_id': self.lot_id,
+            'day': self.day.isoformat(),
+            'bookings': self.bookings,
+            'revenue': float(self.revenue),
+            'occupied_minutes': self.occupied_minutes,
+            'peak_occupancy': self.peak_occupancy
+        }
+
+# Minutes of spot occupancy per lot per hour, from completed stays, behind
+# the occupancy heatmap (see helpers.occupancy)
+class LotHourlyStats(db.Model):
+    __tablename__ = 'lot_hourly_stats'
+
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id', ondelete='CASCADE'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    occupied_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+# Per user, per lot totals behind the user summary
+class UserLotStats(db.Model):
+    __tablename__ = 'user_lot_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id', ondelete='CASCADE'), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
@@ -7,6 +7,11 @@ celery.conf.beat_schedule = {
         'schedule': crontab(hour=17, minute=46)
     },
 
+    'record-daily-peaks': {
+        'task': 'tasks.record_daily_peaks',
+        'schedule': crontab(hour=0, minute=5)
+    },
+
     'send-monthly-reports': {
         'task': 'tasks.send_monthly_reports',
         'schedule': crontab(minute=46, hour=17, day_of_month=29)
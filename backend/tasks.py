@@ -1,31 +1,54 @@
 from helpers.celery_worker import celery
-from utils.mail_utils import send_reminder_email, send_monthly_report, generate_pdf_report
+from utils.mail_utils import send_reminder_email, send_reminder_emails, send_messages, monthly_report_message, generate_pdf_report
 from models.models import Users, ParkingLots, ParkingSpots, Reservations
 from extensions.extensions import db
-from sqlalchemy import exists, func
-from datetime import datetime
-from io import StringIO
+from helpers.lot_stats import record_day_peaks
+from helpers.clear_redis_cache import bump_versions, ADMIN_ANALYTICS_KEY, lot_occupancy_key
+from sqlalchemy import true
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from operator import attrgetter
+from collections import Counter
 from flask import current_app
 import os
 import csv
+import gzip
 
 
 @celery.task
 def send_daily_reminders():
-    users = Users.query.filter_by(is_admin=False)
-    lots = ParkingLots.query.all()
+    booked = db.session.query(Reservations.id) \
+    .join(ParkingSpots, ParkingSpots.id == Reservations.spot_id) \
+    .filter(Reservations.user_id == Users.id, ParkingSpots.lot_id == ParkingLots.id) \
+    .exists()
 
-    for user in users:
-        for lot in lots:
-            reservation_exists = db.session.query(exists().where(Reservations.user_id == user.id).where(Reservations.spot.has(ParkingSpots.lot_id == lot.id))).scalar()
+    # Every (user, lot) pair without a booking, in one anti-join
+    unbooked = db.session.query(Users.email, Users.name, ParkingLots.prime_location_name) \
+    .join(ParkingLots, true()) \
+    .filter(Users.is_admin == False, ~booked) \
+    .order_by(Users.id, ParkingLots.id) \
+    .yield_per(1000)
+
+    batch_size = current_app.config.get('REMINDER_BATCH_SIZE', 500)
+    batch = []
 
-            if not reservation_exists:
-                subject = f"Hey {user.name}, book your spot in {lot.prime_location_name}"
-                body = f"""Hello {user.name},\n\nA new parking lot "{lot.prime_location_name}" is now available.\nYou haven't booked a spot here yet.\nBook now to reserve your place!\n\nRegards,\nParkMan Team"""
+    for email, name, lot_name in unbooked:
+        subject = f"Hey {name}, book your spot in {lot_name}"
+        body = f"""Hello {name},\n\nA new parking lot "{lot_name}" is now available.\nYou haven't booked a spot here yet.\nBook now to reserve your place!\n\nRegards,\nParkMan Team"""
+        batch.append((email, subject.strip(), body.strip()))
 
-                send_reminder_email(user.email, subject.strip(), body.strip())
+        if len(batch) >= batch_size:
+            send_reminder_batch.delay(batch)
+            batch = []
+
+    if batch:
+        send_reminder_batch.delay(batch)
 
 @celery.task
+def send_reminder_batch(reminders):
+    send_reminder_emails(reminders)
+
+@celery.task(autoretry_for=(OSError,), retry_backoff=True, retry_backoff_max=600, retry_kwargs={'max_retries': 5})
 def send_parking_reminder(user_id, lot_id, spot_id):
     user = Users.query.get(user_id)
     lot = ParkingLots.query.get(lot_id)
@@ -35,68 +58,120 @@ def send_parking_reminder(user_id, lot_id, spot_id):
 
     send_reminder_email(user.email, subject.strip(), body.strip())
 
+# Yesterday's peak occupancy per lot, once every stay that overlapped it is known
+@celery.task
+def record_daily_peaks():
+    day = date.today() - timedelta(days=1)
+    peaks = record_day_peaks(day)
+    db.session.commit()
+    bump_versions([ADMIN_ANALYTICS_KEY] + [lot_occupancy_key(lot_id) for lot_id in peaks])
+
+# Streams (user, completed reservations) for every non-admin user, merging
+# the user list with one range query over the month ordered by user
+def iter_monthly_activity(month_start, month_end):
+    users = Users.query.filter_by(is_admin=False).order_by(Users.id).yield_per(1000)
+    reservations = Reservations.history_query() \
+    .join(Users, Users.id == Reservations.user_id) \
+    .filter(
+        Users.is_admin == False,
+        Reservations.parking_timestamp >= month_start,
+        Reservations.parking_timestamp < month_end,
+        Reservations.status == 'completed'
+    ).order_by(Reservations.user_id, Reservations.parking_timestamp).yield_per(1000)
+
+    user_reservations = groupby(reservations, key=attrgetter('user_id'))
+    group = next(user_reservations, None)
+
+    for user in users:
+        while group and group[0] < user.id:
+            group = next(user_reservations, None)
+
+        if group and group[0] == user.id:
+            yield user, list(group[1])
+            group = next(user_reservations, None)
+        else:
+            yield user, []
+
+# Everything a worker needs to build one user's report, as plain JSON
+def monthly_report_data(user, reservations):
+    lot_counts = Counter(reservation.prime_location_name for reservation in reservations)
+
+    return {
+        'user': {'id': user.id, 'name': user.name, 'email': user.email},
+        'bookings_count': len(reservations),
+        'most_used_lot': max(lot_counts, key=lot_counts.get) if lot_counts else 'N/A',
+        'total_spent': str(sum([reservation.parking_cost for reservation in reservations])),
+        'reservations': [{
+            'parking_timestamp': reservation.parking_timestamp.isoformat(),
+            'prime_location_name': reservation.prime_location_name,
+            'parking_cost': str(reservation.parking_cost)
+        } for reservation in reservations]
+    }
+
+# Gathers each user's month in one pass and fans the PDF rendering out to
+# the workers in chunks of MONTHLY_REPORT_CHUNK_SIZE users
 @celery.task
 def send_monthly_reports():
     now = datetime.now()
-    month = now.month
-    year = now.year
+    month_start = datetime(now.year, now.month, 1)
+    month_end = datetime(now.year + 1, 1, 1) if now.month == 12 else datetime(now.year, now.month + 1, 1)
     month_name = now.strftime('%B')
+    chunk_size = current_app.config.get('MONTHLY_REPORT_CHUNK_SIZE', 200)
+    chunk = []
 
-    users = Users.query.filter_by(is_admin=False)
-    for user in users:
-        reservations = Reservations.query \
-        .join(ParkingSpots) \
-        .filter(
-            Reservations.user_id == user.id,
-            func.extract('month', Reservations.parking_timestamp) == month,
-            func.extract('year', Reservations.parking_timestamp) == year,
-            Reservations.status == 'completed'
-        ).all()
-
-        bookings_count = len(reservations)
-        total_spent = sum([reservation.parking_cost for reservation in reservations])
-
-        # Most used lot
-        lot_counts = {}
-        for reservation in reservations:
-            lot = reservation.spot.parking_lot.prime_location_name
-            lot_counts[lot] = lot_counts.get(lot, 0) + 1
-        most_used_lot = max(lot_counts, key=lot_counts.get) if lot_counts else 'N/A'
+    for user, reservations in iter_monthly_activity(month_start, month_end):
+        chunk.append(monthly_report_data(user, reservations))
+
+        if len(chunk) >= chunk_size:
+            send_monthly_report_chunk.delay(month_name, chunk)
+            chunk = []
 
-        pdf_path = generate_pdf_report(user, bookings_count, most_used_lot, total_spent, month_name, reservations)
-        send_monthly_report(user, bookings_count, most_used_lot, total_spent, month_name, pdf_path)
+    if chunk:
+        send_monthly_report_chunk.delay(month_name, chunk)
 
 @celery.task
-def export_parking_history_csv(user_id):
+def send_monthly_report_chunk(month_name, reports):
+    messages = []
+
+    for report in reports:
+        reservations = [dict(reservation, parking_timestamp=datetime.fromisoformat(reservation['parking_timestamp'])) for reservation in report['reservations']]
+        pdf_report = generate_pdf_report(report['user'], report['bookings_count'], report['most_used_lot'], report['total_spent'], month_name, reservations)
+        messages.append(monthly_report_message(report['user'], report['bookings_count'], report['most_used_lot'], report['total_spent'], month_name, pdf_report))
+
+    send_messages(messages)
 
-    reservations = Reservations.query.filter_by(user_id=user_id).all()
+@celery.task
+def export_parking_history_csv(user_id, compress=False):
+    reservations = Reservations.history_query().filter(Reservations.user_id == user_id).order_by(Reservations.id).yield_per(1000)
     user = Users.query.get(user_id)
 
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Reservation ID', 'Lot ID', 'Spot ID', 'Lot Name', 'Vehicle Number', 'Start', 'End', 'Cost', 'Status'])
-
-    for reservation in reservations:
-        writer.writerow([
-            reservation.id,
-            reservation.spot.parking_lot.id if reservation.spot else None,
-            reservation.spot_id,
-            reservation.spot.parking_lot.prime_location_name if reservation.spot else None,
-            reservation.vehicle_number.upper(),
-            reservation.parking_timestamp,
-            reservation.leaving_timestamp,
-            reservation.parking_cost,
-            'Not Parked' if reservation.status == 'pending' else 'Parked In' if reservation.status == 'active' else 'Parked Out'
-        ])
-    
-    filename = f"export_user_{user_id}.csv"
+    filename = f"export_user_{user_id}.csv.gz" if compress else f"export_user_{user_id}.csv"
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__)))
     exports_dir = os.path.join(base_dir, "exports")
     os.makedirs(exports_dir, exist_ok=True)
     file_path = os.path.join(exports_dir, filename)
+    partial_path = f"{file_path}.part"
 
-    with open(file_path, 'w') as f:
-        f.write(output.getvalue())
+    # Rows stream from the cursor straight into the file, which replaces
+    # any previous export only once it is complete
+    with (gzip.open(partial_path, 'wt', newline='') if compress else open(partial_path, 'w', newline='')) as f:
+        writer = csv.writer(f)
+        writer.writerow(['Reservation ID', 'Lot ID', 'Spot ID', 'Lot Name', 'Vehicle Number', 'Start', 'End', 'Cost', 'Status'])
+
+        for reservation in reservations:
+            writer.writerow([
+                reservation.id,
+                reservation.lot_id,
+                reservation.spot_id,
+                reservation.prime_location_name,
+                reservation.vehicle_number.upper(),
+                reservation.parking_timestamp,
+                reservation.leaving_timestamp,
+                reservation.parking_cost,
+                'Not Parked' if reservation.status == 'pending' else 'Parked In' if reservation.status == 'active' else 'Parked Out'
+            ])
+
+    os.replace(partial_path, file_path)
     
     base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
     msg_body = f'Hi {user.name}! Your parking data export is ready.\n\nDownload it here: {base_url}/api/exports/download/{filename}'
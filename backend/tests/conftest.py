@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+
+# The app reads its settings from the environment when it is imported, and
+# modules open their Redis clients at import time, so both are set up here
+# before anything from the app is imported
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ['SECRET_KEY'] = 'test'
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+os.environ['MAIL_DEFAULT_SENDER'] = 'parkman@example.com'
+os.environ['SQL_TRACE'] = 'False'
+
+import fakeredis
+import pytest
+import redis
+
+server = fakeredis.FakeServer()
+
+class FakeRedis(fakeredis.FakeRedis):
+    def __init__(self, *args, **kwargs):
+        super().__init__(server=server)
+
+redis.Redis = FakeRedis
+redis.StrictRedis = FakeRedis
+redis.from_url = lambda *args, **kwargs: FakeRedis()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'query_budget(limit): most SQL statements the code under the query_budget fixture may run')
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from app_factory import init_db
+    from helpers.celery_worker import celery
+
+    app.config.update(TESTING=True, MAIL_SUPPRESS_SEND=True)
+    celery.conf.update(task_always_eager=True, task_eager_propagates=True)
+    init_db()
+    return app
+
+# Every test starts from empty tables and an empty Redis
+@pytest.fixture(autouse=True)
+def clean_state(app):
+    yield
+
+    from extensions.extensions import db
+
+    with app.app_context():
+        db.session.remove()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    FakeRedis().flushall()
+
+# Registers a user and returns a test client logged in as them; the first
+# user registered in a test is the admin
+@pytest.fixture
+def client_for(app):
+    def make_client(email, password='password'):
+        client = app.test_client()
+        client.post('/api/register', json=dict(email=email, name=email.split('@')[0], password=password, address='1 Main Road', pincode='560001', phone='9999999999'))
+        response = client.post('/api/login', json=dict(email=email, password=password))
+        assert response.status_code == 200, response.get_json()
+        return client
+    return make_client
+
+@pytest.fixture
+def admin_client(client_for):
+    return client_for('admin@example.com')
+
+# Fails the test when the code in the block runs more SQL statements than
+# its @pytest.mark.query_budget(limit) allows:
+#     @pytest.mark.query_budget(1)
+#     def test_summary(admin_client, query_budget):
+#         with query_budget():
+#             admin_client.get('/api/parking-lots/admin/summary')
+@pytest.fixture
+def query_budget(request):
+    from helpers import sql_trace
+
+    marker = request.node.get_closest_marker('query_budget')
+    if marker is None:
+        pytest.fail('query_budget needs a @pytest.mark.query_budget(limit) marker')
+
+    def budget():
+        return sql_trace.query_budget(marker.args[0])
+    return budget
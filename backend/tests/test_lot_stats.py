@@ -0,0 +1,36 @@
+from datetime import date, datetime
+
+def test_peaks_carry_overnight_stays_into_days_without_arrivals(app):
+    from helpers.lot_stats import peaks_per_day
+
+    stays = [
+        (datetime(2026, 3, 1, 20), datetime(2026, 3, 3, 9)),
+        (datetime(2026, 3, 1, 21), datetime(2026, 3, 2, 8)),
+        (datetime(2026, 3, 3, 9), datetime(2026, 3, 3, 10)),
+    ]
+    assert peaks_per_day(stays) == {date(2026, 3, 1): 2, date(2026, 3, 2): 2, date(2026, 3, 3): 1}
+
+# The nightly peak and the full rebuild agree, including on a day that only
+# saw a stay carried over from the night before
+def test_nightly_peaks_match_the_rebuild(app, admin_client):
+    from extensions.extensions import db
+    from helpers.lot_stats import rebuild_lot_stats, record_day_peaks
+    from models.models import LotDailyStats, Reservations
+
+    admin_client.post('/api/parking-lots/', json=dict(primeLocationName='North', address='1 Main Road', pincode='560001', price=10, maxSpots=4))
+    with app.app_context():
+        db.session.add_all([
+            Reservations(spot_id=1, user_id=1, vehicle_number='WB12AB0001', parking_cost=10, status='completed', parking_timestamp=datetime(2026, 3, 1, 22), leaving_timestamp=datetime(2026, 3, 3, 7)),
+            Reservations(spot_id=2, user_id=1, vehicle_number='WB12AB0002', parking_cost=10, status='completed', parking_timestamp=datetime(2026, 3, 1, 23), leaving_timestamp=datetime(2026, 3, 2, 6)),
+        ])
+        db.session.commit()
+
+        rebuild_lot_stats()
+        rebuilt = {stats.day: stats.peak_occupancy for stats in LotDailyStats.query}
+        assert rebuilt[date(2026, 3, 2)] == 2
+
+        db.session.query(LotDailyStats).update({'peak_occupancy': 0})
+        for day in rebuilt:
+            record_day_peaks(day)
+        db.session.commit()
+        assert {stats.day: stats.peak_occupancy for stats in LotDailyStats.query} == rebuilt
@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+import smtplib
+
+import pytest
+
+# Stands in for flask_mail's Mail: connect() fails `failures` times with a
+# dropped connection, and messages to a refused address raise like smtplib
+class FakeMail:
+    def __init__(self, failures=0, refused=()):
+        self.failures = failures
+        self.refused = refused
+        self.sent = []
+
+    @contextmanager
+    def connect(self):
+        if self.failures:
+            self.failures -= 1
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        yield self
+
+    def send(self, message):
+        if message.recipients[0] in self.refused:
+            raise smtplib.SMTPRecipientsRefused({message.recipients[0]: (550, b'No such user')})
+        self.sent.append(message)
+
+# Messages are still built with the real Mail extension, registered here
+# before get_mail is swapped out
+@pytest.fixture
+def mail_utils(app):
+    from utils import mail_utils
+
+    mail_utils.get_mail()
+    return mail_utils
+
+# Backoff delays the sender would have slept for
+@pytest.fixture
+def sleeps(mail_utils, monkeypatch):
+    delays = []
+    monkeypatch.setattr(mail_utils.time, 'sleep', delays.append)
+    return delays
+
+def reminders(*addresses):
+    return [(address, 'Reminder', 'Park your vehicle') for address in addresses]
+
+def test_refused_mail_is_logged_and_skipped(mail_utils, monkeypatch, caplog):
+    mail = FakeMail(refused=['gone@example.com'])
+    monkeypatch.setattr(mail_utils, 'get_mail', lambda: mail)
+
+    assert mail_utils.send_reminder_emails(reminders('a@example.com', 'gone@example.com', 'b@example.com')) == 2
+    assert [message.recipients for message in mail.sent] == [['a@example.com'], ['b@example.com']]
+    assert 'Mail to gone@example.com was refused' in caplog.text
+
+def test_reconnects_back_off(mail_utils, sleeps, app, monkeypatch):
+    mail = FakeMail(failures=3)
+    monkeypatch.setattr(mail_utils, 'get_mail', lambda: mail)
+    monkeypatch.setitem(app.config, 'MAIL_RETRY_BACKOFF', 0.5)
+
+    assert mail_utils.send_reminder_emails(reminders('a@example.com')) == 1
+    assert sleeps == [0.5, 1.0, 2.0]
+
+    mail.failures = 4
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        mail_utils.send_reminder_emails(reminders('a@example.com'))
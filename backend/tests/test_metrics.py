@@ -0,0 +1,17 @@
+# /metrics fails closed: no token configured outside debug and testing
+# means no metrics
+def test_metrics_hidden_without_a_token(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'TESTING', False)
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', None)
+    assert app.test_client().get('/metrics').status_code == 404
+
+def test_metrics_require_the_configured_token(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'TESTING', False)
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert '# TYPE parkman_http_responses_total counter' in response.get_data(as_text=True)
@@ -0,0 +1,74 @@
+import pytest
+
+def add_lots(admin_client, count, start=0):
+    lots = [dict(primeLocationName=f'Lot {number}', address='1 Main Road', pincode='560001', price=10, maxSpots=4) for number in range(start, start + count)]
+    response = admin_client.post('/api/parking-lots/import', json=lots)
+    assert response.status_code == 201
+
+# One grouped aggregation, whatever the number of lots
+@pytest.mark.query_budget(1)
+def test_admin_summary_query_count_does_not_grow_with_lots(admin_client, query_budget):
+    add_lots(admin_client, 2)
+    with query_budget() as few:
+        response = admin_client.get('/api/parking-lots/admin/summary')
+    assert len(response.get_json()['lots']) == 2
+
+    add_lots(admin_client, 18, start=2)
+    with query_budget() as many:
+        response = admin_client.get('/api/parking-lots/admin/summary')
+    assert len(response.get_json()['lots']) == 20
+    assert len(few) == len(many)
+
+def test_admin_summary_counts_spots_and_revenue(admin_client, client_for):
+    add_lots(admin_client, 2)
+    client = client_for('user@example.com')
+    client.post('/api/reservations/', json=dict(lotID=1, userID=2, vehicleNo='WB12AB1234'))
+    client.patch('/api/reservations/', json=dict(id=1))
+    client.patch('/api/reservations/', json=dict(id=1))
+    client.post('/api/reservations/', json=dict(lotID=1, userID=2, vehicleNo='WB12AB1235'))
+    admin_client.patch('/api/parking-spots/8')
+
+    lots = admin_client.get('/api/parking-lots/admin/summary').get_json()['lots']
+    assert lots[0] == {'name': 'Lot 0', 'revenue': 10.0, 'occupied': 1, 'unavailable': 0, 'available': 3}
+    assert lots[1] == {'name': 'Lot 1', 'revenue': 0.0, 'occupied': 0, 'unavailable': 1, 'available': 3}
+
+# The cached payload must not reach users who are not admins
+def test_admin_summary_is_admin_only_even_when_cached(admin_client, client_for):
+    add_lots(admin_client, 1)
+    assert admin_client.get('/api/parking-lots/admin/summary').status_code == 200
+
+    response = client_for('user@example.com').get('/api/parking-lots/admin/summary')
+    assert response.status_code == 400
+    assert 'lots' not in response.get_json()
+
+# The stream ends after SSE_MAX_SECONDS so it frees its worker, and the
+# client resumes from the snapshot's event ID
+def test_spot_stream_closes_after_max_seconds(app, admin_client):
+    add_lots(admin_client, 1)
+    app.config['SSE_MAX_SECONDS'] = 1
+    try:
+        response = admin_client.get('/api/parking-lots/spots/stream')
+        body = response.get_data(as_text=True)
+    finally:
+        app.config['SSE_MAX_SECONDS'] = 300
+    assert body.startswith('id: ')
+    assert 'event: snapshot' in body
+
+# Spot counts and import sizes are bounded, as every spot is written in
+# the request that asks for it
+def test_spot_counts_are_bounded(app, admin_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_LOT_SPOTS', 100)
+    monkeypatch.setitem(app.config, 'MAX_IMPORT_LOTS', 3)
+    monkeypatch.setitem(app.config, 'MAX_IMPORT_SPOTS', 150)
+    lot = dict(primeLocationName='North', address='1 Main Road', pincode='560001', price=10)
+
+    assert admin_client.post('/api/parking-lots/', json=dict(lot, maxSpots=101)).status_code == 400
+    assert admin_client.post('/api/parking-lots/', json=dict(lot, maxSpots='many')).status_code == 400
+    assert admin_client.post('/api/parking-lots/', json=dict(lot, maxSpots=100)).status_code == 201
+    assert admin_client.put('/api/parking-lots/1', json=dict(lot, maxSpots=10000000)).status_code == 400
+
+    response = admin_client.post('/api/parking-lots/import', json=[dict(lot, maxSpots=101)])
+    assert response.get_json()['message'] == 'Invalid parking lot on row 1'
+    assert admin_client.post('/api/parking-lots/import', json=[dict(lot, maxSpots=1)] * 4).status_code == 400
+    assert admin_client.post('/api/parking-lots/import', json=[dict(lot, maxSpots=100)] * 2).status_code == 400
+    assert admin_client.post('/api/parking-lots/import', json=[dict(lot, maxSpots=50)] * 3).status_code == 201
@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+import pytest
+
+from extensions.extensions import db
+from helpers.sql_trace import explain
+
+# Statements run on the app's engine inside the block, with their parameters
+@contextmanager
+def captured_statements(app):
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+def plan_of(app, statements, fragment):
+    matching = [(statement, parameters) for statement, parameters in statements if fragment in statement]
+    assert matching, f'no statement containing {fragment!r} ran'
+
+    statement, parameters = matching[0]
+    with app.app_context():
+        return explain(db.session.connection(), statement, parameters)
+
+def assert_no_scan(plan):
+    scans = [row for row in plan if ' SCAN ' in f' {row} ']
+    assert not scans, 'full scan in query plan:\n' + '\n'.join(plan)
+
+@pytest.fixture
+def booked(app, admin_client, client_for):
+    response = admin_client.post('/api/parking-lots/', json=dict(primeLocationName='North', address='1 Main Road', pincode='560001', price=10, maxSpots=5))
+    assert response.status_code == 201
+    client = client_for('user@example.com')
+
+    with captured_statements(app) as statements:
+        response = client.post('/api/reservations/', json=dict(lotID=1, userID=2, vehicleNo='WB12AB1234'))
+    assert response.status_code == 201
+    return client, statements
+
+def test_spot_claim_uses_an_index(app, booked):
+    _, statements = booked
+    assert_no_scan(plan_of(app, statements, 'UPDATE parking_spots'))
+
+def test_vehicle_check_uses_an_index(app, booked):
+    _, statements = booked
+    assert_no_scan(plan_of(app, statements, 'reservations.vehicle_number = ?'))
+
+def test_active_reservation_lookup_uses_an_index(app, booked):
+    client, _ = booked
+    with captured_statements(app) as statements:
+        response = client.get('/api/reservations/1/active')
+    assert response.status_code == 200
+    assert_no_scan(plan_of(app, statements, 'reservations.spot_id = ?'))
+
+def test_monthly_range_query_uses_an_index(app, booked):
+    from tasks import iter_monthly_activity
+
+    with captured_statements(app) as statements:
+        with app.app_context():
+            list(iter_monthly_activity(datetime(2026, 1, 1), datetime(2026, 2, 1)))
+    assert_no_scan(plan_of(app, statements, 'reservations.parking_timestamp >= ?'))
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import os
+import pytest
+
+from extensions.extensions import db
+from models.models import ParkingLots, Reservations, Users
+
+# Completed stays for the user, spread over the lot's spots and the lots
+def add_history(app, email, count):
+    with app.app_context():
+        user = Users.query.filter_by(email=email).first()
+        spots = [spot for lot in ParkingLots.query.all() for spot in lot.spots]
+        start = datetime(2026, 1, 1, 8) + timedelta(days=Reservations.query.count())
+        db.session.add_all(Reservations(spot_id=spots[index % len(spots)].id, user_id=user.id, parking_timestamp=start + timedelta(hours=index), leaving_timestamp=start + timedelta(hours=index, minutes=30), parking_cost=Decimal('10.00'), status='completed', vehicle_number=f'WB12AB{index:04d}') for index in range(count))
+        db.session.commit()
+        return user.id
+
+@pytest.fixture
+def user_client(admin_client, client_for):
+    for name in ('North', 'South'):
+        response = admin_client.post('/api/parking-lots/', json=dict(primeLocationName=name, address='1 Main Road', pincode='560001', price=10, maxSpots=5))
+        assert response.status_code == 201
+    client = client_for('user@example.com')
+
+    # Leave the session user's snapshot cached, as it is after any request
+    client.get('/api/check-auth')
+    return client
+
+# Statements run to serve the history, after adding stays to bring it to
+# `rows` in total
+def history_statements(app, client, rows, query_budget):
+    with app.app_context():
+        existing = Reservations.query.count()
+    add_history(app, 'user@example.com', rows - existing)
+    with query_budget() as statements:
+        response = client.get('/api/reservations/')
+    assert response.status_code == 200
+    assert len(response.get_json()['reservations']) == rows
+    return len(statements)
+
+def export_statements(app, client, rows, query_budget):
+    with app.app_context():
+        existing = Reservations.query.count()
+    user_id = add_history(app, 'user@example.com', rows - existing)
+    with query_budget() as statements:
+        response = client.post('/api/exports/csv')
+    assert response.status_code == 201
+
+    path = os.path.join(app.root_path, 'exports', f'export_user_{user_id}.csv')
+    with open(path) as f:
+        assert len(f.readlines()) == rows + 1
+    os.remove(path)
+    return len(statements)
+
+# The joined history query, whatever the number of rows
+@pytest.mark.query_budget(1)
+def test_history_query_count_does_not_grow_with_rows(app, user_client, query_budget):
+    few = history_statements(app, user_client, 2, query_budget)
+    many = history_statements(app, user_client, 40, query_budget)
+    assert few == many
+
+# The streamed history query and the user to email
+@pytest.mark.query_budget(2)
+def test_export_query_count_does_not_grow_with_rows(app, user_client, query_budget):
+    few = export_statements(app, user_client, 2, query_budget)
+    many = export_statements(app, user_client, 40, query_budget)
+    assert few == many
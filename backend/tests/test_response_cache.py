@@ -0,0 +1,31 @@
+from flask import jsonify
+
+def counting_view(calls):
+    def view():
+        calls.append(1)
+        return jsonify(success = True)
+    return view
+
+# A request that takes the lock just after another one filled the cache
+# serves that payload instead of rendering again
+def test_render_once_rechecks_the_cache_under_the_lock(app):
+    from helpers.response_cache import render_once
+
+    calls = []
+    with app.test_request_context():
+        render_once('parking:test:v1', 60, counting_view(calls))
+        response = render_once('parking:test:v1', 60, counting_view(calls))
+    assert response.get_json() == {'success': True}
+    assert len(calls) == 1
+
+# A render that outlived its lock leaves the next holder's lock in place
+def test_render_once_only_releases_its_own_lock(app):
+    from helpers.response_cache import render_once, r
+
+    def slow_view():
+        r.set('parking:test:v1:lock', 'other')
+        return jsonify(success = True)
+
+    with app.test_request_context():
+        render_once('parking:test:v1', 60, slow_view)
+    assert r.get('parking:test:v1:lock') == b'other'
@@ -0,0 +1,10 @@
+# The profile edit hashes the new password after handing its connection
+# back, and the detached user must still be saved
+def test_edit_profile_changes_password(app, client_for):
+    client = client_for('user@example.com')
+    response = client.put('/api/users/1', json=dict(name='user', email='user@example.com', password='changed', confirmPassword='changed', address='2 Main Road', pincode='560002'))
+    assert response.status_code == 200, response.get_json()
+
+    fresh = app.test_client()
+    assert fresh.post('/api/login', json=dict(email='user@example.com', password='password')).status_code != 200
+    assert fresh.post('/api/login', json=dict(email='user@example.com', password='changed')).status_code == 200
@@ -0,0 +1,77 @@
+import socketserver
+import threading
+import time
+
+# Minimal in-process SMTP server that accepts and counts messages, used to
+# measure bulk mail throughput offline. connect_delay stands in for the
+# TCP/TLS handshake cost of a real mail server.
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, connect_delay=0.0):
+        super().__init__((host, port), FakeSMTPHandler)
+        self.connect_delay = connect_delay
+        self.connections = 0
+        self.messages = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        time.sleep(server.connect_delay)
+        with server.lock:
+            server.connections += 1
+
+        self.reply('220 localhost fake smtp ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command.startswith('DATA'):
+                self.reply('354 end data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                with server.lock:
+                    server.messages += 1
+                self.reply('250 OK')
+            elif command.startswith('QUIT'):
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--connect-delay', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(port=args.port, connect_delay=args.connect_delay)
+    print(f'Fake SMTP server listening on port {server.port}')
+    server.serve_forever()
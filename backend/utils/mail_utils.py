@@ -1,26 +1,97 @@
-from flask_mail import Mail, Message
-from flask import render_template
-from app_factory import create_app
-from fpdf import FPDF
+from app_factory import get_app
+from helpers.metrics import increment, MAIL_REJECTED
+from collections import deque
+import smtplib
+import time
 import os
 
-app = create_app()
-mail = Mail(app)
+app = get_app()
 
-def send_reminder_email(to, subject, body):
+# flask_mail and fpdf are only needed by the Celery tasks that send mail, so
+# they are imported on first use instead of with every web process
+mail = None
+
+def get_mail():
+    global mail
+    if mail is None:
+        from flask_mail import Mail
+        mail = Mail(app)
+    return mail
+
+# Message() reads the default sender from the Mail extension, so it has to
+# be registered before the first message is built
+def new_message(**kwargs):
+    from flask_mail import Message
+
+    get_mail()
+    return Message(**kwargs)
+
+# Sends messages over one SMTP connection per chunk of MAIL_BATCH_SIZE,
+# reconnecting and resuming when the server drops the connection, after a
+# backoff of MAIL_RETRY_BACKOFF seconds that doubles with each retry.
+# Messages the server refuses are logged, counted and skipped.
+def send_messages(messages):
+    with app.app_context():
+        batch_size = app.config['MAIL_BATCH_SIZE']
+        max_retries = app.config['MAIL_MAX_RETRIES']
+        backoff = app.config['MAIL_RETRY_BACKOFF']
+        pending = deque(messages)
+        sent = 0
+
+        while pending:
+            chunk = deque(pending.popleft() for _ in range(min(batch_size, len(pending))))
+            retries = 0
+
+            while chunk:
+                try:
+                    with get_mail().connect() as connection:
+                        while chunk:
+                            try:
+                                connection.send(chunk[0])
+                                sent += 1
+                            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                                app.logger.warning('Mail to %s was refused: %s', ', '.join(chunk[0].recipients), e)
+                                increment(MAIL_REJECTED, error=type(e).__name__)
+                            chunk.popleft()
+                except OSError as e:
+                    retries += 1
+                    if retries > max_retries:
+                        raise
+                    delay = backoff * 2 ** (retries - 1)
+                    app.logger.warning('Mail connection failed (%s), retrying in %.1fs', e, delay)
+                    time.sleep(delay)
+
+        return sent
+
+def reminder_message(to, subject, body):
     with app.app_context():
-        msg = Message(subject=subject, recipients=[to], body=body)
-        mail.send(msg)
+        return new_message(subject=subject, recipients=[to], body=body)
+
+def send_reminder_email(to, subject, body):
+    return send_messages([reminder_message(to, subject, body)])
 
-def send_monthly_report(user, bookings_count, most_used_lot, total_spent, month_name, pdf_path):
+def send_reminder_emails(reminders):
+    return send_messages([reminder_message(to, subject, body) for to, subject, body in reminders])
+
+# Loaded once per worker process; Jinja and fpdf would otherwise look the
+# template and font file up again for every report
+report_template = None
+report_font_path = os.path.join(os.path.dirname(__file__), "../fonts/rupeesans.ttf")
+
+def get_report_template():
+    global report_template
+    if report_template is None:
+        report_template = app.jinja_env.get_template("monthly_report.html")
+    return report_template
+
+def monthly_report_message(user, bookings_count, most_used_lot, total_spent, month_name, pdf_report):
     with app.app_context():
-        msg = Message(
+        msg = new_message(
             subject = f"Your Monthly Report - {month_name}",
-            recipients = [user.email]
+            recipients = [user['email']]
         )
 
-        html_body = render_template(
-            "monthly_report.html",
+        html_body = get_report_template().render(
             bookings_count=bookings_count,
             most_used_lot=most_used_lot,
             total_spent=total_spent,
@@ -30,32 +101,31 @@ def send_monthly_report(user, bookings_count, most_used_lot, total_spent, month_
         msg.html = html_body
         
         msg.body = "Please find your monthly parking activity report attached"
-        with open(pdf_path, 'rb') as fp:
-            msg.attach(f'Monthly_Report_{user.name}.pdf', "application/pdf", fp.read())
+        msg.attach(f"Monthly_Report_{user['name']}.pdf", "application/pdf", pdf_report)
+        return msg
 
-        mail.send(msg)
-        os.remove(pdf_path)
+def send_monthly_report(user, bookings_count, most_used_lot, total_spent, month_name, pdf_report):
+    return send_messages([monthly_report_message(user, bookings_count, most_used_lot, total_spent, month_name, pdf_report)])
 
+# Renders the report straight to PDF bytes, so any worker can build and mail
+# it without a file shared through /tmp
 def generate_pdf_report(user, bookings_count, most_used_lot, total_spent, month_name, reservations=None):
-    with app.app_context():
-        html = render_template(
-            "monthly_report.html",
-            user=user,
-            bookings_count=bookings_count,
-            most_used_lot=most_used_lot,
-            total_spent=total_spent,
-            month_name=month_name,
-            reservations=reservations
-        )
-        
-        pdf_path = f"/tmp/monthly_report_{user.id}.pdf"
-        font_path = os.path.join(os.path.dirname(__file__), "../fonts/rupeesans.ttf")
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.add_font('rupeesans', style='', fname=font_path)
-        pdf.add_font('rupeesans', style='B', fname=font_path)
-        pdf.set_font(family='rupeesans', style='B', size=12)
-        pdf.write_html(html)
-        pdf.output(pdf_path)
-
-        return pdf_path
\ No newline at end of file
+    from fpdf import FPDF
+
+    html = get_report_template().render(
+        user=user,
+        bookings_count=bookings_count,
+        most_used_lot=most_used_lot,
+        total_spent=total_spent,
+        month_name=month_name,
+        reservations=reservations
+    )
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.add_font('rupeesans', style='', fname=report_font_path)
+    pdf.add_font('rupeesans', style='B', fname=report_font_path)
+    pdf.set_font(family='rupeesans', style='B', size=12)
+    pdf.write_html(html)
+
+    return bytes(pdf.output())
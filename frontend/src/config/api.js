@@ -1,6 +1,18 @@
 import axios from 'axios'
 
-export default axios.create({
+const api = axios.create({
     baseURL: import.meta.env.VITE_API_BASE_URL,
     withCredentials: true
-})
\ No newline at end of file
+})
+
+// Fetches one page of a paginated list endpoint, starting after cursor
+// (the first page when it is null), along with the cursor for the next one
+export async function fetchPage(url, key, cursor = null) {
+    const separator = url.includes('?') ? '&' : '?'
+    const response = await api.get(cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url)
+    if (response.status != 200 || !response.data.success) return { items: [], nextCursor: null }
+
+    return { items: response.data[key], nextCursor: response.data.next_cursor }
+}
+
+export default api
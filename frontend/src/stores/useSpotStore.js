@@ -0,0 +1,84 @@
+import { defineStore } from "pinia";
+import { ref } from "vue";
+import axios from "../config/api";
+
+// Spot statuses for every lot, kept current by one shared server-sent
+// events stream instead of per-card polling
+export const useSpotStore = defineStore("spots", () => {
+  const spotsByLot = ref({});
+  let source = null;
+  let subscribers = 0;
+
+  // Unpacks [firstID, count] runs and 2-bit statuses from the bulk endpoint
+  // and the stream's snapshot
+  function decodeSpots(lotID, lot, statuses) {
+    const states = Uint8Array.from(atob(lot.states), (c) => c.charCodeAt(0));
+    const spots = [];
+    for (const [firstID, count] of lot.ranges)
+      for (let id = firstID; id < firstID + count; id++) {
+        const index = spots.length;
+        const code = (states[index >> 2] >> ((index & 3) * 2)) & 3;
+        spots.push({ id, lot_id: Number(lotID), status: statuses[code] });
+      }
+    return spots;
+  }
+
+  async function fetchLotsSpots(lotIDs) {
+    const params = new URLSearchParams();
+    lotIDs.forEach((lotID) => params.append("lot_id", lotID));
+    try {
+      const response = await axios.get(`/api/parking-lots/spots/bulk?${params}`);
+      if (response.status == 200 && response.data.success)
+        for (const [lotID, lot] of Object.entries(response.data.lots))
+          spotsByLot.value[lotID] = decodeSpots(lotID, lot, response.data.statuses);
+    } catch (error) {
+      lotIDs.forEach((lotID) => delete spotsByLot.value[lotID]);
+    }
+  }
+
+  async function fetchLotSpots(lotID) {
+    await fetchLotsSpots([lotID]);
+  }
+
+  function handleSnapshot(event) {
+    const { lots, statuses } = JSON.parse(event.data);
+    const spots = {};
+    for (const [lotID, lot] of Object.entries(lots))
+      spots[lotID] = decodeSpots(lotID, lot, statuses);
+    spotsByLot.value = spots;
+  }
+
+  function handleSpot(event) {
+    const { lot_id, id, status } = JSON.parse(event.data);
+    const spot = spotsByLot.value[lot_id]?.find((spot) => spot.id === id);
+    if (spot) spot.status = status;
+  }
+
+  function handleReset(event) {
+    fetchLotSpots(JSON.parse(event.data).lot_id);
+  }
+
+  // EventSource reconnects on its own and resumes from the last event ID
+  function subscribe() {
+    subscribers++;
+    if (source) return;
+
+    source = new EventSource(
+      `${import.meta.env.VITE_API_BASE_URL ?? ""}/api/parking-lots/spots/stream`,
+      { withCredentials: true }
+    );
+    source.addEventListener("snapshot", handleSnapshot);
+    source.addEventListener("spot", handleSpot);
+    source.addEventListener("reset", handleReset);
+  }
+
+  function unsubscribe() {
+    subscribers--;
+    if (subscribers > 0 || !source) return;
+
+    source.close();
+    source = null;
+  }
+
+  return { spotsByLot, fetchLotSpots, fetchLotsSpots, subscribe, unsubscribe };
+});